@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from utils.decorators import ErrorHandler
+from utils.requests import get_url_params
 from flask_jwt_extended import (
     jwt_required,
     jwt_refresh_token_required
@@ -59,7 +60,13 @@ def logout():
 @ErrorHandler(logger, authentication)
 @admin_required
 def get_tokens():
-    result, status_code = TokenResponse().lists()
+    params = get_url_params(request)
+    result, status_code = TokenResponse(request).lists(
+        page=params['page'],
+        page_size=params['page_size'],
+        cursor=params['cursor'],
+        stream=params['stream']
+    )
     return result, status_code
 
 
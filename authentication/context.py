@@ -0,0 +1,70 @@
+from flask import g
+from flask_jwt_extended import (
+    verify_jwt_in_request,
+    get_raw_jwt
+)
+from flask_jwt_extended.config import config
+from utils.blacklist_helpers import is_token_revoked
+
+
+# Per-request authentication state, kept on `flask.g` so the JWT is decoded,
+# verified and checked against the blacklist once per request no matter how
+# many decorators and responses ask for it.
+
+
+class AuthContext:
+
+    def __init__(self, raw_jwt):
+        self.raw_jwt = raw_jwt
+        self.jti = raw_jwt.get('jti')
+        self.identity = raw_jwt.get(config.identity_claim_key)
+        self.claims = raw_jwt.get(config.user_claims_key, {})
+
+    @property
+    def revoked(self):
+        return token_revocation(self.raw_jwt)
+
+    def __repr__(self):
+        return f'<AuthContext {self.jti}>'
+
+
+def token_revocation(decoded_token):
+    """
+    Returns the revocation verdict of the token, asking the blacklist only
+    the first time it is needed in the current request.
+    """
+    verdicts = g.setdefault('token_verdicts', dict())
+    jti = decoded_token['jti']
+    if jti not in verdicts:
+        verdicts[jti] = is_token_revoked(decoded_token)
+    return verdicts[jti]
+
+
+def get_auth_context():
+    """
+    Returns the `AuthContext` of the current request. The token is only
+    verified here when no `jwt_required` has already done it.
+    """
+    context = g.get('auth_context', None)
+    if context is not None:
+        return context
+    raw_jwt = get_raw_jwt()
+    if not raw_jwt:
+        verify_jwt_in_request()
+        raw_jwt = get_raw_jwt()
+    g.auth_context = AuthContext(raw_jwt)
+    return g.auth_context
+
+
+def clear_auth_context():
+    g.pop('auth_context', None)
+    g.pop('token_verdicts', None)
+
+
+def authorization_header(token) -> dict:
+    """
+    Header sending `token` the way the app reads it, see `JWT_HEADER_NAME`
+    and `JWT_HEADER_TYPE`. Needs an app context.
+    """
+    header_type = config.header_type
+    return {config.header_name: f'{header_type} {token}' if header_type else token}
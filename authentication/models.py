@@ -11,11 +11,11 @@ class TokenBlacklist(Base):
     __tablename__ = 'tokens'
 
     id = Column(Integer, primary_key=True)
-    jti = Column(String(36), nullable=False)
+    jti = Column(String(36), nullable=False, index=True)
     token_type = Column(String(10), nullable=False)
-    user_identity = Column(String(50), nullable=False)
+    user_identity = Column(String(50), nullable=False, index=True)
     revoked = Column(Boolean, nullable=False)
-    expires = Column(DateTime, nullable=False)
+    expires = Column(DateTime, nullable=False, index=True)
 
     def __init__(self, jti, token_type, user_identity, revoked, expires):
         self.jti = jti
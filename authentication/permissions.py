@@ -1,11 +1,8 @@
 from flaskr import jwt
 from functools import wraps
-from flask_jwt_extended import (
-    verify_jwt_in_request,
-    get_jwt_claims
-)
 from utils.errors import NotAuthorizedError
-from utils.blacklist_helpers import is_token_revoked
+from utils.tracing import span
+from .context import get_auth_context, token_revocation
 
 
 # ROLES VALIDATIONS
@@ -13,8 +10,9 @@ from utils.blacklist_helpers import is_token_revoked
 # Define our callback function to check if a token has been revoked or not
 
 @jwt.token_in_blacklist_loader
+@span('token_revocation')
 def check_if_token_revoked(decoded_token):
-    return is_token_revoked(decoded_token)
+    return token_revocation(decoded_token)
 
 
 @jwt.user_claims_loader
@@ -29,6 +27,7 @@ def prohibitted(fn):
     """
 
     @wraps(fn)
+    @span('prohibitted')
     def wrapper(*args, **kwargs):
         raise NotAuthorizedError()
     return wrapper
@@ -41,9 +40,9 @@ def admin_required(fn):
     """
 
     @wraps(fn)
+    @span('admin_required')
     def wrapper(*args, **kwargs):
-        verify_jwt_in_request()
-        claims = get_jwt_claims()
+        claims = get_auth_context().claims
         if claims.get('roles', None) \
                 and isinstance(claims['roles'], dict) \
                 and claims['roles'].get('is_superuser', None):
@@ -59,9 +58,9 @@ def manager_required(fn):
     """
 
     @wraps(fn)
+    @span('manager_required')
     def wrapper(*args, **kwargs):
-        verify_jwt_in_request()
-        claims = get_jwt_claims()
+        claims = get_auth_context().claims
         if claims.get('roles', None) \
                 and isinstance(claims['roles'], dict) \
                 and (claims['roles'].get('is_manager', None)
@@ -78,9 +77,9 @@ def staff_required(fn):
     """
 
     @wraps(fn)
+    @span('staff_required')
     def wrapper(*args, **kwargs):
-        verify_jwt_in_request()
-        claims = get_jwt_claims()
+        claims = get_auth_context().claims
         if claims.get('roles', None) \
                 and isinstance(claims['roles'], dict) \
                 and (claims['roles'].get('is_seller', None)
@@ -6,36 +6,37 @@ from utils.errors import (
     NotFoundError,
     ClientException,
     NotAuthorizedError,
-    TokenNotFound
+    TokenNotFound,
+    ServiceUnavailableError
 )
-from utils.responses import AbstractResponse
+from utils.responses import AbstractResponse, GenericListResponse
 from utils.serializers import SuccessResponseSchema
-from settings.database import session
+from settings.database import database_writer
 from flask_jwt_extended import (
     create_access_token,
     create_refresh_token,
     decode_token,
-    get_jwt_identity,
-    get_raw_jwt,
     jwt_required
 )
 from .serializers import AuthenticationSchema, ToKenBlackListSchema
 from http import HTTPStatus
 from flask import jsonify
 from workforce.models import User
+from .models import TokenBlacklist
 from workforce.serializers import UserSchema
 from datetime import timedelta
 from flask_bcrypt import check_password_hash
-from flaskr import bcrypt
+from flaskr import hasher
 from .permissions import add_claims_to_access_token
+from .context import get_auth_context
 from utils.blacklist_helpers import (
     is_token_revoked,
     add_token_to_database,
-    get_user_tokens,
+    read_token_claims,
     revoke_token,
     unrevoke_token,
     prune_database,
-    get_token
+    token_recorder
 )
 import os
 
@@ -60,13 +61,24 @@ class AuthenticationResponse:
 
             user = User.query.filter_by(username=auth['username']).one()
 
-            check = bcrypt.check_password_hash(
+            check = hasher.check_password_hash(
                 user.password, auth['password'])
 
             if not check:
                 raise NotAuthorizedError(
                     user_err_msg='Bad username or password')
 
+            # Move the stored hash to the configured work factor. It is
+            # only opportunistic: with the pool saturated the login goes on
+            # and the rehash waits for a later one.
+            if hasher.needs_rehash(user.password):
+                try:
+                    user.password = hasher.generate_password_hash(
+                        auth['password'])
+                    user, = database_writer.save(user)
+                except ServiceUnavailableError:
+                    pass
+
             identity = dict()
             roles = {
                 'is_seller': user.is_seller,
@@ -86,11 +98,13 @@ class AuthenticationResponse:
 
             # Store the tokens in our store with a status of not currently revoked.
             add_token_to_database(
-                access_token, os.environ.get('JWT_IDENTITY_CLAIM'))
+                read_token_claims(access_token),
+                os.environ.get('JWT_IDENTITY_CLAIM'))
 
             # TODO: USE OR NOT USE ? METHOD FOR TOKEN EXPIRED ?
             # add_token_to_database(
-            #     refresh_token, os.environ.get('JWT_IDENTITY_CLAIM'))
+            #     read_token_claims(refresh_token),
+            #     os.environ.get('JWT_IDENTITY_CLAIM'))
 
             ret = {
                 'access_token': access_token,
@@ -105,21 +119,21 @@ class AuthenticationResponse:
             raise e
 
     def refresh(self):
-        current_user = get_jwt_identity()
+        current_user = get_auth_context().identity
         access_token = create_access_token(
             identity=current_user, expires_delta=self._EXPIRES)
         add_token_to_database(
-            access_token, os.environ.get('JWT_IDENTITY_CLAIM'))
+            read_token_claims(access_token),
+            os.environ.get('JWT_IDENTITY_CLAIM'))
         ret = {
             'access_token': access_token
         }
         return jsonify(ret), HTTPStatus.OK
 
     def logout(self):
-        jti = get_raw_jwt()['jti']
-        current_user = get_jwt_identity()
+        auth = get_auth_context()
         try:
-            revoke_token(user=current_user, jti=jti)
+            revoke_token(user=auth.identity, jti=auth.jti)
             serializer = SuccessResponseSchema().load(
                 {'message': 'Token revoked', 'status': HTTPStatus.OK})
             return serializer, HTTPStatus.OK
@@ -138,7 +152,7 @@ class AuthenticationResponse:
             raise ClientException(user_err_msg='`revoke` must be a boolean')
 
         # Revoke or unrevoke the token based on what was passed to this function
-        current_user = get_jwt_identity()
+        current_user = get_auth_context().identity
         try:
             if revoke:
                 revoke_token(current_user, token_id=token_id)
@@ -154,10 +168,10 @@ class AuthenticationResponse:
                 user_err_msg='The specified token was not found')
 
     def is_valid(self):
-        token = get_token(get_raw_jwt())
+        revoked = get_auth_context().revoked
         OkErrorSchema = Schema.from_dict(
             {'message': fields.Boolean(), 'status': fields.Int()})
-        if token:
+        if not revoked:
             serializer = OkErrorSchema().load(
                 {'message': True, 'status': HTTPStatus.OK})
             return serializer, HTTPStatus.OK
@@ -166,10 +180,15 @@ class AuthenticationResponse:
         return serializer, HTTPStatus.OK
 
 
-class TokenResponse:
+class TokenResponse(GenericListResponse):
+    model = TokenBlacklist
+    schema = ToKenBlackListSchema
 
-    def lists(self):
-        user_identity = get_jwt_identity()
-        all_tokens = get_user_tokens(user_identity)
-        ret = [ToKenBlackListSchema().dump(token) for token in all_tokens]
-        return jsonify(ret), HTTPStatus.OK
+    def get_queryset(self, *args, **kwargs):
+        """Tokens, revoked and unrevoked, of the current user."""
+        token_recorder.flush()
+        user_identity = get_auth_context().identity
+        return TokenBlacklist.query.filter_by(
+            user_identity=user_identity['username'],
+            **kwargs
+        ).order_by(TokenBlacklist.id)
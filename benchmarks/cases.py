@@ -0,0 +1,110 @@
+import base64
+import os
+from http import HTTPStatus
+from utils.images_helpers import BASE_DIR
+from .seed import PASSWORD, username
+
+CASES = dict()
+
+# 48 KiB image, base64 encoded like the clients send it.
+IMAGE = base64.b64encode(os.urandom(48 * 1024)).decode('ascii')
+
+
+class Case:
+    """
+    One benchmarked request. `build(context, i)` returns the method, url
+    and keyword arguments of the test client for the i-th request; the
+    request counts as an error unless it answers `status`. `setup` and
+    `teardown` run around the whole case. A `one_per_user` case uses a
+    different seeded user for each request.
+    """
+
+    def __init__(self, name, build, status=HTTPStatus.OK, setup=None,
+                 teardown=None, one_per_user=False):
+        self.name = name
+        self.build = build
+        self.status = status
+        self.setup = setup
+        self.teardown = teardown
+        self.one_per_user = one_per_user
+
+
+def case(name, status=HTTPStatus.OK, setup=None, teardown=None,
+         one_per_user=False):
+    def decorator(build):
+        CASES[name] = Case(name, build, status, setup, teardown, one_per_user)
+        return build
+    return decorator
+
+
+class Context:
+    """Seeded sizes and the admin headers shared by the cases."""
+
+    def __init__(self, users, tokens, headers):
+        self.users = users
+        self.tokens = tokens
+        self.headers = headers
+        # Sellers need a user without one, each request takes the next.
+        self.next_seller = 0
+        self.images = set()
+
+
+def user_id(context, i) -> int:
+    # The superuser is 1, the seeded users follow.
+    return 2 + i % max(context.users, 1)
+
+
+@case('login', HTTPStatus.CREATED)
+def login(context, i):
+    return 'POST', '/authentication/login', dict(
+        json={'username': username(i % max(context.users, 1)),
+              'password': PASSWORD})
+
+
+@case('token_valid')
+def token_valid(context, i):
+    return 'GET', '/authentication/auth/token/valid', dict(
+        headers=context.headers)
+
+
+@case('get_user')
+def get_user(context, i):
+    return 'GET', f'/workforce/user/{user_id(context, i * 7919)}', dict(
+        headers=context.headers)
+
+
+@case('add_seller', HTTPStatus.CREATED, one_per_user=True)
+def add_seller(context, i):
+    seller_user = 2 + context.next_seller
+    context.next_seller += 1
+    return 'POST', '/workforce/seller', dict(
+        json={'user_id': seller_user}, headers=context.headers)
+
+
+@case('token_list')
+def token_list(context, i):
+    return 'GET', '/authentication/auth/token/list', dict(
+        headers=context.headers)
+
+
+def _images_directory():
+    return os.path.join(BASE_DIR, 'workforce', 'static', 'images')
+
+
+def _list_images(context):
+    directory = _images_directory()
+    context.images = set(os.listdir(directory)) if os.path.isdir(directory) else set()
+
+
+def _remove_new_images(context):
+    directory = _images_directory()
+    if os.path.isdir(directory):
+        for name in set(os.listdir(directory)) - context.images:
+            os.remove(os.path.join(directory, name))
+
+
+@case('upload_image', setup=_list_images, teardown=_remove_new_images)
+def upload_image(context, i):
+    return 'POST', f'/workforce/user/{user_id(context, i)}/image', dict(
+        json={'thumbnail': IMAGE, 'extension': 'png'},
+        headers=context.headers)
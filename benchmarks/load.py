@@ -0,0 +1,370 @@
+import http.client
+import json
+import multiprocessing
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+from sqlalchemy import create_engine, text
+from .runner import benchmark_config, summarize
+from .seed import ADMIN_USERNAME, PASSWORD, scratch_database, username
+
+# Operation -> (weight in the mix, statuses that are not errors).
+OPERATIONS = {
+    'login': (10, {201}),
+    'revoke': (5, {200}),
+    'check_revoked': (0, {200, 401}),
+    'add_seller': (10, {201, 409}),
+    'token_valid': (25, {200}),
+    'get_user': (35, {200}),
+    'token_list': (15, {200}),
+}
+
+
+def authorization_template(app=None) -> dict:
+    """
+    Authorization header of the server with a `{token}` placeholder, read
+    from the config of `app`, or of the settings when the server runs
+    elsewhere.
+    """
+    if app is None:
+        from flask import Flask
+        from flask_jwt_extended import JWTManager
+        from settings.settings import ProductionConfig
+        app = Flask(__name__)
+        app.config.from_object(ProductionConfig())
+        JWTManager(app)
+    from authentication.context import authorization_header
+    with app.app_context():
+        return authorization_header('{token}')
+
+
+class Client:
+    """
+    JSON over one keep-alive HTTP connection, reopened after errors. Tokens
+    are sent with `authorization`, see `authorization_template`.
+    """
+
+    def __init__(self, url, authorization, timeout=30):
+        self.authorization = authorization
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._connection = None
+
+    def request(self, method, path, data=None, token=None) -> tuple:
+        """Returns the status (0 when the request failed) and the JSON body."""
+        headers = dict()
+        if token:
+            headers.update((name, value.format(token=token))
+                           for name, value in self.authorization.items())
+        body = None
+        if data is not None:
+            headers['Content-Type'] = 'application/json'
+            body = json.dumps(data)
+        try:
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection(
+                    self.host, self.port, timeout=self.timeout)
+            self._connection.request(
+                method, self.prefix + path, body=body, headers=headers)
+            response = self._connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            return 0, None
+        try:
+            return response.status, json.loads(content) if content else None
+        except ValueError:
+            return response.status, None
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class Worker:
+    """
+    One client thread running the mixed workload until `deadline`. Records
+    every request as (end time, operation, latency, status), the tokens it got
+    from logins and the ones it revoked, and the revoked tokens the server
+    still accepted.
+    """
+
+    def __init__(self, url, authorization, admin_token, users, hot_users,
+                 deadline, seed):
+        self.client = Client(url, authorization)
+        self.admin_token = admin_token
+        self.users = users
+        self.hot_users = hot_users
+        self.deadline = deadline
+        self.random = random.Random(seed)
+        self.samples = list()
+        self.issued = list()
+        self.revoked = list()
+        self.accepted_revoked = list()
+        self._tokens = list()
+        self._names = [name for name, (weight, _) in OPERATIONS.items() if weight]
+        self._weights = [OPERATIONS[name][0] for name in self._names]
+
+    def call(self, operation, method, path, data=None, token=None):
+        start = time.perf_counter()
+        status, body = self.client.request(method, path, data, token)
+        end = time.time()
+        self.samples.append(
+            (end, operation, time.perf_counter() - start, status))
+        return status, body
+
+    def user_id(self, users):
+        # The superuser is 1, the seeded users follow.
+        return 2 + self.random.randrange(max(users, 1))
+
+    def run(self):
+        while time.time() < self.deadline:
+            operation = self.random.choices(self._names, self._weights)[0]
+            if operation == 'revoke' and not self._tokens:
+                operation = 'login'
+            getattr(self, operation)()
+        self.client.close()
+
+    def login(self):
+        status, body = self.call('login', 'POST', '/authentication/login', {
+            'username': username(self.user_id(self.users) - 2),
+            'password': PASSWORD})
+        if status == 201:
+            self.issued.append(body['access_token'])
+            self._tokens.append(body['access_token'])
+
+    def revoke(self):
+        token = self._tokens.pop()
+        status, _ = self.call(
+            'revoke', 'DELETE', '/authentication/logout', token=token)
+        if status != 200:
+            return
+        self.revoked.append(token)
+        status, body = self.call(
+            'check_revoked', 'GET', '/authentication/auth/token/valid',
+            token=token)
+        if status == 200 and body and body.get('message') is True:
+            self.accepted_revoked.append(token)
+
+    def add_seller(self):
+        # Few users, so concurrent creations for the same user do happen.
+        self.call('add_seller', 'POST', '/workforce/seller',
+                  {'user_id': self.user_id(self.hot_users)},
+                  token=self.admin_token)
+
+    def token_valid(self):
+        self.call('token_valid', 'GET', '/authentication/auth/token/valid',
+                  token=self.admin_token)
+
+    def get_user(self):
+        self.call('get_user', 'GET', f'/workforce/user/{self.user_id(self.users)}',
+                  token=self.admin_token)
+
+    def token_list(self):
+        self.call('token_list', 'GET', '/authentication/auth/token/list',
+                  token=self.admin_token)
+
+
+def run_threads(url, authorization, admin_token, users, hot_users, threads,
+                deadline, seed=0) -> dict:
+    """Runs `threads` workers until `deadline` and merges their records."""
+    workers = [Worker(url, authorization, admin_token, users, hot_users,
+                      deadline, seed + i)
+               for i in range(threads)]
+    pool = [threading.Thread(target=worker.run, name=f'soak-{i}', daemon=True)
+            for i, worker in enumerate(workers)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return dict(
+        samples=[sample for worker in workers for sample in worker.samples],
+        issued=[token for worker in workers for token in worker.issued],
+        revoked=[token for worker in workers for token in worker.revoked],
+        accepted_revoked=[token for worker in workers
+                          for token in worker.accepted_revoked],
+    )
+
+
+def _quiet_request_handler():
+    from werkzeug.serving import WSGIRequestHandler
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+    return QuietRequestHandler
+
+
+def _run_process(arguments) -> dict:
+    return run_threads(*arguments)
+
+
+def _jti(token) -> str:
+    from utils.blacklist_helpers import read_token_claims
+    return read_token_claims(token)['jti']
+
+
+def check_invariants(database_url, records, client) -> list:
+    """
+    Violations found after the run:
+    - tokens issued by a login but missing from the database,
+    - revoked tokens not stored as revoked, or still accepted by the server,
+    - users with more than one seller.
+    """
+    violations = list()
+    accepted = list(records['accepted_revoked'])
+    for token in records['revoked']:
+        status, body = client.request(
+            'GET', '/authentication/auth/token/valid', token=token)
+        if status == 200 and body and body.get('message') is True:
+            accepted.append(token)
+    if accepted:
+        violations.append(f'{len(set(accepted))} revoked tokens accepted')
+
+    issued = {_jti(token) for token in records['issued']}
+    revoked = {_jti(token) for token in records['revoked']}
+    engine = create_engine(database_url)
+    try:
+        with engine.connect() as connection:
+            stored = dict()
+            jtis = list(issued)
+            for start in range(0, len(jtis), 500):
+                chunk = jtis[start:start + 500]
+                rows = connection.execute(
+                    text('SELECT jti, revoked FROM tokens WHERE jti IN (%s)'
+                         % ','.join(f':j{i}' for i in range(len(chunk)))),
+                    {f'j{i}': jti for i, jti in enumerate(chunk)})
+                stored.update((row[0], bool(row[1])) for row in rows)
+            lost = issued - set(stored)
+            if lost:
+                violations.append(f'{len(lost)} of {len(issued)} issued tokens lost')
+            not_revoked = [jti for jti in revoked if stored.get(jti) is False]
+            if not_revoked:
+                violations.append(
+                    f'{len(not_revoked)} revoked tokens stored as not revoked')
+            duplicates = connection.execute(text(
+                'SELECT user_id, COUNT(*) FROM sellers WHERE deleted = 0 '
+                'GROUP BY user_id HAVING COUNT(*) > 1')).fetchall()
+            if duplicates:
+                violations.append(
+                    f'{len(duplicates)} users with duplicate sellers: '
+                    + ', '.join(f'{user_id} ({count})'
+                                for user_id, count in duplicates[:10]))
+    finally:
+        engine.dispose()
+    return violations
+
+
+def report(samples, started, interval) -> dict:
+    """Totals per operation and per `interval` seconds since `started`."""
+    operations = dict()
+    elapsed = max((end for end, *_ in samples), default=started) - started
+    for name in OPERATIONS:
+        latencies = [latency for _, operation, latency, _ in samples
+                     if operation == name]
+        errors = sum(1 for _, operation, _, status in samples
+                     if operation == name and status not in OPERATIONS[name][1])
+        if latencies:
+            operations[name] = summarize(latencies, elapsed, errors)
+    timeline = list()
+    buckets = dict()
+    for end, operation, latency, status in samples:
+        bucket = buckets.setdefault(int((end - started) // interval), ([], [0]))
+        bucket[0].append(latency)
+        bucket[1][0] += status not in OPERATIONS[operation][1]
+    for index in sorted(buckets):
+        latencies, (errors,) = buckets[index]
+        # The last bucket only lasts until the last request.
+        span = min(interval, elapsed - index * interval) or interval
+        timeline.append(dict(second=index * interval,
+                             **summarize(latencies, span, errors)))
+    return dict(operations=operations, timeline=timeline)
+
+
+def run_soak(workdir, url=None, database_url=None, users=10000, tokens=10000,
+             threads=8, processes=1, duration=60, interval=5, hot_users=100,
+             reseed=False, admin_username=ADMIN_USERNAME,
+             admin_password=PASSWORD, max_error_rate=0.01) -> dict:
+    """
+    Drives `threads` client threads in each of `processes` processes at the
+    app for `duration` seconds, then checks the invariants. The run also
+    fails when more than `max_error_rate` of the requests failed or when
+    no revocation or seller creation succeeded, the checks would then pass
+    without testing anything.
+
+    Without `url` the app is served by a threaded werkzeug server in this
+    process, on a scratch database of `users` users and `tokens` tokens.
+    With `url` the server is yours: it must serve a database built by
+    `seed_database`, reachable at `database_url` for the checks.
+    """
+    server = app = None
+    if url is None:
+        from flaskr import create_app
+        from werkzeug.serving import make_server
+        path = scratch_database(workdir, users, tokens, reseed=reseed)
+        database_url = f'sqlite:///{path}'
+        app = create_app(benchmark_config(path))
+        server = make_server('127.0.0.1', 0, app, threaded=True,
+                             request_handler=_quiet_request_handler())
+        threading.Thread(target=server.serve_forever, name='soak-server',
+                         daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}'
+    elif database_url is None:
+        raise ValueError('database_url is required with url.')
+    authorization = authorization_template(app)
+    client = Client(url, authorization)
+    try:
+        status, body = client.request('POST', '/authentication/login', {
+            'username': admin_username, 'password': admin_password})
+        if status != 201:
+            raise RuntimeError(f'Login of {admin_username} failed: {body}')
+        admin_token = body['access_token']
+
+        started = time.time()
+        deadline = started + duration
+        arguments = [(url, authorization, admin_token, users, hot_users,
+                      threads, deadline, i * threads) for i in range(processes)]
+        if processes > 1:
+            context = multiprocessing.get_context('spawn')
+            with context.Pool(processes) as pool:
+                parts = pool.map(_run_process, arguments)
+        else:
+            parts = [_run_process(arguments[0])]
+        records = {key: [value for part in parts for value in part[key]]
+                   for key in parts[0]}
+
+        if app is not None:
+            from utils.blacklist_helpers import token_recorder
+            with app.app_context():
+                token_recorder.flush()
+        else:
+            # Leaves the server time to write its buffered tokens.
+            time.sleep(1)
+        violations = check_invariants(database_url, records, client)
+    finally:
+        client.close()
+        if server is not None:
+            server.shutdown()
+    samples = records['samples']
+    errors = sum(1 for _, operation, _, status in samples
+                 if status not in OPERATIONS[operation][1])
+    if errors > max_error_rate * len(samples):
+        violations.append(f'{errors} of {len(samples)} requests failed, '
+                          f'more than {max_error_rate:.1%}')
+    if not records['revoked']:
+        violations.append('no token was revoked')
+    if not any(operation == 'add_seller' and status == 201
+               for _, operation, _, status in samples):
+        violations.append('no seller was created')
+    results = report(samples, started, interval)
+    results['meta'] = dict(
+        url=url, users=users, tokens=tokens, threads=threads,
+        processes=processes, duration=duration, hot_users=hot_users,
+        issued=len(records['issued']), revoked=len(records['revoked']))
+    results['violations'] = violations
+    return results
@@ -0,0 +1,150 @@
+import datetime
+import json
+import math
+import platform
+import time
+from settings.settings import ProductionConfig
+from .cases import CASES, Context
+from .seed import ADMIN_USERNAME, PASSWORD, scratch_database
+
+
+def percentile(values, q) -> float:
+    """Nearest-rank percentile `q` (0 to 100) of sorted `values`."""
+    if not values:
+        return 0.0
+    return values[max(math.ceil(q / 100 * len(values)) - 1, 0)]
+
+
+def summarize(latencies, elapsed, errors) -> dict:
+    """Throughput and latency percentiles, in milliseconds, of one case."""
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return dict(
+        requests=count,
+        errors=errors,
+        throughput=round(count / elapsed, 2) if elapsed else 0.0,
+        mean_ms=round(sum(latencies) / count * 1000, 3) if count else 0.0,
+        p50_ms=round(percentile(latencies, 50) * 1000, 3),
+        p95_ms=round(percentile(latencies, 95) * 1000, 3),
+        p99_ms=round(percentile(latencies, 99) * 1000, 3),
+    )
+
+
+def run_case(client, case, context, requests, warmup=0) -> dict:
+    if case.setup:
+        case.setup(context)
+    try:
+        for i in range(warmup):
+            method, url, kwargs = case.build(context, i)
+            client.open(url, method=method, **kwargs)
+        latencies = list()
+        errors = 0
+        started = time.perf_counter()
+        for i in range(warmup, warmup + requests):
+            method, url, kwargs = case.build(context, i)
+            start = time.perf_counter()
+            response = client.open(url, method=method, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != case.status:
+                errors += 1
+        elapsed = time.perf_counter() - started
+    finally:
+        if case.teardown:
+            case.teardown(context)
+    return summarize(latencies, elapsed, errors)
+
+
+def benchmark_config(path):
+    config = ProductionConfig()
+    config.DATABASE_URL = f'sqlite:///{path}'
+    config.DATABASE_REPLICA_URLS = None
+    config.DATABASE_REPLICA_SYNC_INTERVAL = 0
+    return config
+
+
+def run_benchmarks(workdir, users=10000, tokens=10000, requests=200,
+                   warmup=20, names=None, reseed=False, progress=None) -> dict:
+    """
+    Seeds (or reuses) a scratch database of `users` users and `tokens`
+    tokens in `workdir`, runs the cases `names` (every case by default)
+    through the Flask test client and returns the results: `requests`
+    measured requests per case after `warmup` unmeasured ones.
+    `progress(name, result)` is called after each case.
+    """
+    from flaskr import create_app
+    from authentication.context import authorization_header
+
+    names = list(names or CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        raise ValueError(f'Unknown benchmarks {", ".join(unknown)}.')
+    for name in names:
+        if CASES[name].one_per_user and warmup + requests > users:
+            raise ValueError(f'{name} needs a user per request, '
+                             f'warmup + requests must not exceed {users}')
+    path = scratch_database(workdir, users, tokens,
+                            log_rounds=ProductionConfig.BCRYPT_LOG_ROUNDS,
+                            reseed=reseed)
+    app = create_app(benchmark_config(path))
+    client = app.test_client()
+    response = client.post('/authentication/login', json={
+        'username': ADMIN_USERNAME, 'password': PASSWORD})
+    if response.status_code != 201:
+        raise RuntimeError(f'Login of {ADMIN_USERNAME} failed: {response.get_json()}')
+    with app.app_context():
+        headers = authorization_header(response.get_json()['access_token'])
+    context = Context(users, tokens, headers)
+    results = dict(
+        meta=dict(
+            created=datetime.datetime.now().isoformat(timespec='seconds'),
+            host=platform.node(),
+            platform=platform.platform(),
+            python=platform.python_version(),
+            users=users,
+            tokens=tokens,
+            requests=requests,
+            warmup=warmup,
+        ),
+        cases=dict(),
+    )
+    for name in names:
+        result = run_case(client, CASES[name], context, requests, warmup)
+        results['cases'][name] = result
+        if progress:
+            progress(name, result)
+    return results
+
+
+def write_results(path, results):
+    with open(path, 'w') as results_file:
+        json.dump(results, results_file, indent=2, sort_keys=True)
+
+
+def read_results(path) -> dict:
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def compare(results, baseline, threshold=0.2) -> list:
+    """
+    Regressions of `results` against `baseline`: the cases whose p95
+    latency grew, or whose throughput dropped, by more than `threshold`
+    (0.2 is 20%), or that failed more requests.
+    """
+    regressions = list()
+    for name, result in results['cases'].items():
+        previous = baseline.get('cases', {}).get(name)
+        if previous is None:
+            continue
+        if previous['p95_ms'] and \
+                result['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+            regressions.append(
+                f'{name}: p95 {previous["p95_ms"]}ms -> {result["p95_ms"]}ms')
+        if previous['throughput'] and \
+                result['throughput'] < previous['throughput'] * (1 - threshold):
+            regressions.append(
+                f'{name}: throughput {previous["throughput"]}/s -> {result["throughput"]}/s')
+        if result['errors'] > previous['errors']:
+            regressions.append(
+                f'{name}: errors {previous["errors"]} -> {result["errors"]}')
+    return regressions
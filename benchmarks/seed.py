@@ -0,0 +1,75 @@
+import datetime
+import os
+import shutil
+import uuid
+from flask_bcrypt import generate_password_hash
+from sqlalchemy import create_engine
+from settings.database import Base
+
+ADMIN_USERNAME = 'bench-admin'
+PASSWORD = 'benchmark'
+
+
+def username(i) -> str:
+    return f'bench-{i}'
+
+
+def seed_database(path, users, tokens, log_rounds=10, chunk_size=10000):
+    """
+    Creates the SQLite database `path` with a superuser `ADMIN_USERNAME`
+    (id 1), `users` users `username(i)` (ids 2 and up) and `tokens` valid
+    tokens spread over them. Every password is `PASSWORD`, hashed once
+    with `log_rounds`. Rows are inserted `chunk_size` at a time.
+    """
+    import workforce.models
+    import authentication.models
+    import settings.migrations
+    User = workforce.models.User
+    TokenBlacklist = authentication.models.TokenBlacklist
+
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f'sqlite:///{path}')
+    try:
+        Base.metadata.create_all(bind=engine)
+        settings.migrations.stamp(bind=engine)
+        password = generate_password_hash(PASSWORD, log_rounds).decode('utf-8')
+        now = datetime.datetime.now()
+        expires = now + datetime.timedelta(days=1)
+        with engine.begin() as connection:
+            connection.execute(User.__table__.insert(), [dict(
+                username=ADMIN_USERNAME, password=password, is_superuser=True,
+                is_manager=False, is_seller=False, is_costumer=False,
+                is_active=True, deleted=False, created=now, modified=now)])
+            for start in range(0, users, chunk_size):
+                connection.execute(User.__table__.insert(), [dict(
+                    username=username(i), password=password,
+                    is_superuser=False, is_manager=False, is_seller=True,
+                    is_costumer=False, is_active=True, deleted=False,
+                    created=now, modified=now)
+                    for i in range(start, min(start + chunk_size, users))])
+            for start in range(0, tokens, chunk_size):
+                connection.execute(TokenBlacklist.__table__.insert(), [dict(
+                    jti=str(uuid.uuid4()), token_type='access',
+                    user_identity=username(i % max(users, 1)),
+                    revoked=False, expires=expires)
+                    for i in range(start, min(start + chunk_size, tokens))])
+    finally:
+        engine.dispose()
+
+
+def scratch_database(workdir, users, tokens, log_rounds=10, reseed=False) -> str:
+    """
+    Path of a fresh copy of the seeded database of this size. The seeded
+    database is kept in `workdir` and only built again with `reseed` or
+    another `log_rounds`, each run gets its own copy.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    seeded = os.path.join(
+        workdir, f'seed-{users}-{tokens}-{log_rounds}.sqlite')
+    if reseed or not os.path.exists(seeded):
+        seed_database(seeded + '.tmp', users, tokens, log_rounds)
+        os.replace(seeded + '.tmp', seeded)
+    path = os.path.join(workdir, f'run-{users}-{tokens}.sqlite')
+    shutil.copyfile(seeded, path)
+    return path
@@ -1,13 +1,24 @@
 from settings.database import (
     init_db as initialize_database,
     drop_db as drop_database,
+    get_engine,
+    sync_sqlite_replicas,
     session
 )
+from settings.migrations import (
+    migrate as apply_migrations,
+    rollback as rollback_migrations,
+    show_migrations
+)
 from pathlib import Path
 import click
+import datetime
+import json
 import os
+import tempfile
 from flaskr import create_app, bcrypt
 from settings.settings import (
+    BASEDIR,
     DevelopmentConfig,
     ProductionConfig,
     TestingConfig
@@ -16,25 +27,82 @@ from utils.click_styles import (
     Aborted,
     Created,
     Dropped,
-    Initialized
+    Initialized,
+    Migrated,
+    Reverted
 )
 from flask_bcrypt import generate_password_hash
 from flask import jsonify
 from workforce.models import User
+from utils.blacklist_helpers import (
+    add_token_to_database,
+    prune_database,
+    read_token_claims
+)
+from utils.memory import memory_tracker
+from benchmarks.cases import CASES
+from benchmarks.load import run_soak
+from benchmarks.runner import (
+    compare,
+    read_results,
+    run_benchmarks,
+    write_results
+)
+from utils.profiling import call_endpoint, profile_endpoint
+from flask_jwt_extended import create_access_token
+from authentication.context import authorization_header
+from utils.hashing import calibrate_log_rounds
 from workforce.serializers import UserSchema
 
 
 ROOT = Path(os.path.dirname(os.path.abspath(__file__)))
 
 
+def superuser_headers(app, username):
+    """Authorization header of a new access token of the superuser `username`"""
+    with app.app_context():
+        user = User.query.filter(User.username == username).first()
+        if user is None or not user.is_superuser:
+            raise Exception(f'{username} is not a superuser')
+        identity = {
+            'username': user.username,
+            'roles': {
+                'is_seller': user.is_seller,
+                'is_costumer': user.is_costumer,
+                'is_superuser': user.is_superuser,
+                'is_manager': user.is_manager
+            }
+        }
+        access_token = create_access_token(identity=identity)
+        add_token_to_database(
+            read_token_claims(access_token),
+            os.environ.get('JWT_IDENTITY_CLAIM'))
+        return authorization_header(access_token)
+
+
 def callback(ctx, param, value):
     if not value:
         ctx.abort()
 
 
+def save_setting(key, value):
+    """Sets `key` in settings/.env, the file loaded by settings.settings."""
+    filename = os.path.join(BASEDIR, '.env')
+    lines = list()
+    if os.path.exists(filename):
+        with open(filename) as in_file:
+            lines = [line for line in in_file.read().splitlines()
+                     if line.split('=')[0].strip() != key]
+    lines.append(f'{key}={value}')
+    with open(filename, 'w') as out_file:
+        out_file.write('\n'.join(lines) + '\n')
+    return filename
+
+
 @click.group()
 def cli():
-    pass
+    # Commands that do not build the app still need a bound session.
+    get_engine()
 
 
 @cli.command()
@@ -59,7 +127,7 @@ def createsuperuser(name):
             else:
 
                 password_crypt = bcrypt.generate_password_hash(
-                    'admin', 10).decode('utf-8')
+                    'admin').decode('utf-8')
 
                 user = User(name, password_crypt, True, False, False, False)
 
@@ -77,6 +145,57 @@ def createsuperuser(name):
             Aborted(f'Create superuser produce the followings errors: {e}.'))
 
 
+@cli.command()
+@click.option(
+    '-t',
+    '--target',
+    'target',
+    default=100.0,
+    help='Maximum milliseconds allowed for one hash.',
+    type=float,
+    metavar='<float>'
+)
+@click.option(
+    '--min-rounds',
+    'min_rounds',
+    default=10,
+    help='Lowest work factor accepted.',
+    type=click.IntRange(4, 31),
+    metavar='<int>'
+)
+@click.option(
+    '--max-rounds',
+    'max_rounds',
+    default=16,
+    help='Highest work factor tried.',
+    type=click.IntRange(4, 31),
+    metavar='<int>'
+)
+@click.option(
+    '--save',
+    is_flag=True,
+    help='Store the chosen work factor as BCRYPT_LOG_ROUNDS in settings/.env',
+)
+def calibrate_bcrypt(target, min_rounds, max_rounds, save):
+    """Pick the bcrypt work factor for this host"""
+    try:
+        rounds, timings = calibrate_log_rounds(
+            target, min_rounds=min_rounds, max_rounds=max_rounds)
+        for cost, elapsed in timings:
+            click.echo(f'cost {cost:>2}: {elapsed:8.1f} ms')
+        if timings[0][1] > target:
+            click.echo(Aborted(
+                f'Even cost {min_rounds} exceeds {target} ms on this host.'))
+            return
+        click.echo(Initialized(f'BCRYPT_LOG_ROUNDS={rounds}'))
+        if save:
+            filename = save_setting('BCRYPT_LOG_ROUNDS', rounds)
+            click.echo(Created(f'BCRYPT_LOG_ROUNDS saved to {filename}.'))
+    except Exception as e:
+        click.echo(
+            Aborted(f'Calibrate bcrypt produce the following error: {e}.'))
+
+
 @cli.command()
 @click.option(
     '--env',
@@ -138,6 +257,581 @@ def drop_db():
             Aborted(f'Dropped database produce the following error: {e}.'))
 
 
+@cli.command()
+@click.option(
+    '-t',
+    '--target',
+    'target',
+    default=None,
+    help='Stop after the migration whose name starts with TARGET.',
+    type=str,
+    metavar='<text>'
+)
+def migrate(target):
+    """Apply pending database migrations"""
+    try:
+        applied = apply_migrations(target=target)
+        for migration in applied:
+            click.echo(Migrated(f'{migration.name}: {migration.description}'))
+        if not applied:
+            click.echo(Initialized('No migrations to apply.'))
+    except Exception as e:
+        click.echo(Aborted(f'Migrate produce the following error: {e}.'))
+
+
+@cli.command()
+@click.option(
+    '-s',
+    '--steps',
+    'steps',
+    default=1,
+    help='Number of migrations to revert.',
+    type=int,
+    metavar='<int>'
+)
+@click.option(
+    '--yes',
+    is_flag=True,
+    callback=callback,
+    expose_value=False,
+    prompt='Do you want to continue?',
+    help='Continue or abort execution',
+)
+def rollback(steps):
+    """Revert the latest database migrations"""
+    try:
+        for migration in rollback_migrations(steps=steps):
+            click.echo(Reverted(f'{migration.name}: {migration.description}'))
+    except Exception as e:
+        click.echo(Aborted(f'Rollback produce the following error: {e}.'))
+
+
+@cli.command()
+@click.option(
+    '-b',
+    '--batch-size',
+    'batch_size',
+    default=1000,
+    help='Tokens deleted per statement.',
+    type=click.IntRange(min=1),
+    metavar='<int>'
+)
+@click.option(
+    '-p',
+    '--pause',
+    'pause',
+    default=0.05,
+    help='Seconds to sleep between batches.',
+    type=float,
+    metavar='<float>'
+)
+def prune_tokens(batch_size, pause):
+    """Delete expired tokens"""
+    try:
+        total = prune_database(batch_size=batch_size, pause=pause)
+        click.echo(Dropped(f'{total} expired tokens pruned.'))
+    except Exception as e:
+        click.echo(Aborted(f'Prune tokens produce the following error: {e}.'))
+
+
+@cli.command()
+def showmigrations():
+    """List migrations and whether they are applied"""
+    try:
+        for migration, applied in show_migrations():
+            mark = '[X]' if applied else '[ ]'
+            click.echo(f'{mark} {migration.name}: {migration.description}')
+    except Exception as e:
+        click.echo(
+            Aborted(f'Show migrations produce the following error: {e}.'))
+
+
+@cli.command()
+def sync_replicas():
+    """Copy the SQLite database over its SQLite read replicas"""
+    try:
+        copied = sync_sqlite_replicas()
+        click.echo(Initialized(f'{copied} replicas synchronized.'))
+    except Exception as e:
+        click.echo(
+            Aborted(f'Sync replicas produce the following error: {e}.'))
+
+
+
+@cli.command()
+@click.option(
+    '-e',
+    '--endpoint',
+    'endpoint',
+    required=True,
+    help='Endpoint to profile, e.g. workforce.get_users.',
+    type=str,
+    metavar='<text>'
+)
+@click.option(
+    '-n',
+    '--requests',
+    'requests',
+    default=100,
+    help='Requests sent to the endpoint.',
+    type=int,
+    metavar='<int>'
+)
+@click.option(
+    '-m',
+    '--method',
+    'method',
+    default=None,
+    help='HTTP method, the first one of the endpoint by default.',
+    type=str,
+    metavar='<text>'
+)
+@click.option(
+    '-v',
+    '--value',
+    'values',
+    multiple=True,
+    help='URL rule value as key=value, repeatable.',
+    type=str,
+    metavar='<text>'
+)
+@click.option(
+    '-d',
+    '--data',
+    'data',
+    default=None,
+    help='JSON body of the requests.',
+    type=str,
+    metavar='<text>'
+)
+@click.option(
+    '-u',
+    '--username',
+    'username',
+    default='admin',
+    help='Superuser the requests are authenticated as.',
+    type=str,
+    metavar='<text>'
+)
+@click.option(
+    '-f',
+    '--format',
+    'output_format',
+    type=click.Choice(['collapsed', 'pstats'], case_sensitive=False),
+    default='collapsed',
+    help='Format of the output file.'
+)
+@click.option(
+    '-o',
+    '--output',
+    'output',
+    default=None,
+    help='File the profile is written to.',
+    type=click.Path(dir_okay=False, writable=True),
+    metavar='<path>'
+)
+@click.option(
+    '-t',
+    '--top',
+    'top',
+    default=20,
+    help='Functions listed, sorted by cumulative time.',
+    type=int,
+    metavar='<int>'
+)
+def profile(endpoint, requests, method, values, data, username,
+            output_format, output, top):
+    """Profile an endpoint through the test client"""
+    try:
+        app = create_app()
+        result = profile_endpoint(
+            app, endpoint, requests=requests, method=method,
+            values=dict(value.split('=', 1) for value in values),
+            data=json.loads(data) if data else None,
+            headers=superuser_headers(app, username))
+        if result is None:
+            raise Exception(f'no request reached {endpoint}')
+        click.echo(result.top(limit=top))
+        if output:
+            if output_format == 'pstats':
+                Path(output).write_bytes(result.pstats())
+            else:
+                Path(output).write_text(result.collapsed())
+            click.echo(Created(f'Profile of {result.requests} requests written to {output}.'))
+    except Exception as e:
+        click.echo(Aborted(f'Profile produce the following error: {e}.'))
+
+
+@cli.command()
+@click.option(
+    '-e',
+    '--endpoint',
+    'endpoint',
+    required=True,
+    help='Endpoint to track, e.g. workforce.get_users.',
+    type=str,
+    metavar='<text>'
+)
+@click.option(
+    '-n',
+    '--requests',
+    'requests',
+    default=100,
+    help='Requests sent to the endpoint.',
+    type=int,
+    metavar='<int>'
+)
+@click.option(
+    '-w',
+    '--warmup',
+    'warmup',
+    default=10,
+    help='Requests sent before the first snapshot, to fill the caches.',
+    type=int,
+    metavar='<int>'
+)
+@click.option(
+    '-m',
+    '--method',
+    'method',
+    default=None,
+    help='HTTP method, the first one of the endpoint by default.',
+    type=str,
+    metavar='<text>'
+)
+@click.option(
+    '-v',
+    '--value',
+    'values',
+    multiple=True,
+    help='URL rule value as key=value, repeatable.',
+    type=str,
+    metavar='<text>'
+)
+@click.option(
+    '-d',
+    '--data',
+    'data',
+    default=None,
+    help='JSON body of the requests.',
+    type=str,
+    metavar='<text>'
+)
+@click.option(
+    '-u',
+    '--username',
+    'username',
+    default='admin',
+    help='Superuser the requests are authenticated as.',
+    type=str,
+    metavar='<text>'
+)
+@click.option(
+    '-f',
+    '--filename',
+    'pattern',
+    default=None,
+    help='Only list the allocation sites of matching files, e.g. */workforce/*.',
+    type=str,
+    metavar='<text>'
+)
+@click.option(
+    '-t',
+    '--top',
+    'top',
+    default=20,
+    help='Allocation sites listed.',
+    type=int,
+    metavar='<int>'
+)
+def memory(endpoint, requests, warmup, method, values, data, username,
+           pattern, top):
+    """Track the allocations of an endpoint through the test client"""
+    try:
+        app = create_app()
+        options = dict(
+            method=method, values=dict(value.split('=', 1) for value in values),
+            data=json.loads(data) if data else None,
+            headers=superuser_headers(app, username))
+        memory_tracker.start()
+        call_endpoint(app, endpoint, requests=warmup, **options)
+        memory_tracker.reset()
+        memory_tracker.snapshot()
+        call_endpoint(app, endpoint, requests=requests, **options)
+        sites = memory_tracker.snapshot(limit=top, pattern=pattern)
+        result = memory_tracker.get(endpoint)
+        if result is None:
+            raise Exception(f'no request reached {endpoint}')
+        for key, value in result.summary().items():
+            click.echo(f'{key}: {value}')
+        for site in sites:
+            click.echo(f'{site["size_diff"]:+12d} B {site["count_diff"]:+8d} '
+                       f'blocks  {site["site"]}')
+    except Exception as e:
+        click.echo(Aborted(f'Memory produce the following error: {e}.'))
+
+
+@cli.command()
+@click.option(
+    '-c',
+    '--case',
+    'names',
+    multiple=True,
+    type=click.Choice(list(CASES)),
+    help='Benchmark to run, repeatable. Every benchmark by default.'
+)
+@click.option(
+    '-u',
+    '--users',
+    'users',
+    default=10000,
+    help='Users of the scratch database.',
+    type=int,
+    metavar='<int>'
+)
+@click.option(
+    '-k',
+    '--tokens',
+    'tokens',
+    default=10000,
+    help='Tokens of the scratch database.',
+    type=int,
+    metavar='<int>'
+)
+@click.option(
+    '-n',
+    '--requests',
+    'requests',
+    default=200,
+    help='Measured requests per benchmark.',
+    type=int,
+    metavar='<int>'
+)
+@click.option(
+    '-w',
+    '--warmup',
+    'warmup',
+    default=20,
+    help='Requests sent before measuring.',
+    type=int,
+    metavar='<int>'
+)
+@click.option(
+    '-d',
+    '--workdir',
+    'workdir',
+    default=os.path.join(tempfile.gettempdir(), 'flaskr-bench'),
+    help='Directory of the scratch databases.',
+    type=click.Path(file_okay=False),
+    metavar='<path>'
+)
+@click.option(
+    '--reseed',
+    is_flag=True,
+    help='Seed the scratch database again.'
+)
+@click.option(
+    '-o',
+    '--output',
+    'output',
+    default=None,
+    help='JSON results file, in the workdir by default.',
+    type=click.Path(dir_okay=False, writable=True),
+    metavar='<path>'
+)
+@click.option(
+    '-b',
+    '--baseline',
+    'baseline',
+    default=None,
+    help='JSON results of a previous run to compare with.',
+    type=click.Path(exists=True, dir_okay=False),
+    metavar='<path>'
+)
+@click.option(
+    '-t',
+    '--threshold',
+    'threshold',
+    default=0.2,
+    help='Regression tolerated against the baseline, 0.2 is 20%.',
+    type=float,
+    metavar='<float>'
+)
+def bench(names, users, tokens, requests, warmup, workdir, reseed, output,
+          baseline, threshold):
+    """Benchmark the core endpoints on a scratch database"""
+    try:
+        results = run_benchmarks(
+            workdir, users=users, tokens=tokens, requests=requests,
+            warmup=warmup, names=names, reseed=reseed,
+            progress=lambda name, result: click.echo(
+                f'{name:<14} {result["throughput"]:>9.1f}/s '
+                f'p50 {result["p50_ms"]:>8.2f}ms p95 {result["p95_ms"]:>8.2f}ms '
+                f'p99 {result["p99_ms"]:>8.2f}ms errors {result["errors"]}'))
+        output = output or os.path.join(
+            workdir, f'results-{datetime.datetime.now():%Y%m%d-%H%M%S}.json')
+        write_results(output, results)
+        click.echo(Created(f'Results written to {output}.'))
+        regressions = [
+            f'{name}: {result["errors"]} of {result["requests"]} requests failed'
+            for name, result in results['cases'].items() if result['errors']]
+        if baseline:
+            regressions += compare(results, read_results(baseline), threshold)
+    except Exception as e:
+        click.echo(Aborted(f'Bench produce the following error: {e}.'))
+        raise SystemExit(1)
+    if regressions:
+        for regression in regressions:
+            click.echo(Aborted(regression))
+        raise SystemExit(1)
+
+
+@cli.command()
+@click.option(
+    '-t',
+    '--threads',
+    'threads',
+    default=8,
+    help='Client threads per process.',
+    type=int,
+    metavar='<int>'
+)
+@click.option(
+    '-p',
+    '--processes',
+    'processes',
+    default=1,
+    help='Client processes.',
+    type=int,
+    metavar='<int>'
+)
+@click.option(
+    '-s',
+    '--duration',
+    'duration',
+    default=60,
+    help='Seconds the workload runs.',
+    type=float,
+    metavar='<float>'
+)
+@click.option(
+    '-i',
+    '--interval',
+    'interval',
+    default=5,
+    help='Seconds per line of the timeline.',
+    type=float,
+    metavar='<float>'
+)
+@click.option(
+    '-u',
+    '--users',
+    'users',
+    default=10000,
+    help='Users of the scratch database.',
+    type=int,
+    metavar='<int>'
+)
+@click.option(
+    '-k',
+    '--tokens',
+    'tokens',
+    default=10000,
+    help='Tokens of the scratch database.',
+    type=int,
+    metavar='<int>'
+)
+@click.option(
+    '--hot-users',
+    'hot_users',
+    default=100,
+    help='Users the sellers are created for.',
+    type=int,
+    metavar='<int>'
+)
+@click.option(
+    '-d',
+    '--workdir',
+    'workdir',
+    default=os.path.join(tempfile.gettempdir(), 'flaskr-bench'),
+    help='Directory of the scratch databases.',
+    type=click.Path(file_okay=False),
+    metavar='<path>'
+)
+@click.option(
+    '--reseed',
+    is_flag=True,
+    help='Seed the scratch database again.'
+)
+@click.option(
+    '--url',
+    'url',
+    default=None,
+    help='Running server to load instead of a local one.',
+    type=str,
+    metavar='<url>'
+)
+@click.option(
+    '--database-url',
+    'database_url',
+    default=None,
+    help='Database of the server given with --url, for the checks.',
+    type=str,
+    metavar='<url>'
+)
+@click.option(
+    '-e',
+    '--max-error-rate',
+    'max_error_rate',
+    default=0.01,
+    help='Failed requests tolerated, 0.01 is 1%.',
+    type=float,
+    metavar='<float>'
+)
+@click.option(
+    '-o',
+    '--output',
+    'output',
+    default=None,
+    help='JSON results file.',
+    type=click.Path(dir_okay=False, writable=True),
+    metavar='<path>'
+)
+def soak(threads, processes, duration, interval, users, tokens, hot_users,
+         workdir, reseed, url, database_url, max_error_rate, output):
+    """Load the app with concurrent clients and check its invariants"""
+    try:
+        results = run_soak(
+            workdir, url=url, database_url=database_url, users=users,
+            tokens=tokens, threads=threads, processes=processes,
+            duration=duration, interval=interval, hot_users=hot_users,
+            reseed=reseed, max_error_rate=max_error_rate)
+        for name, result in results['operations'].items():
+            click.echo(
+                f'{name:<14} {result["requests"]:>7} req {result["throughput"]:>8.1f}/s '
+                f'errors {result["errors"] / result["requests"]:>6.1%} '
+                f'p50 {result["p50_ms"]:>8.2f}ms p95 {result["p95_ms"]:>8.2f}ms '
+                f'p99 {result["p99_ms"]:>8.2f}ms')
+        for result in results['timeline']:
+            click.echo(
+                f'{result["second"]:>6g}s {result["throughput"]:>8.1f}/s '
+                f'errors {result["errors"] / result["requests"]:>6.1%} '
+                f'p50 {result["p50_ms"]:>8.2f}ms p95 {result["p95_ms"]:>8.2f}ms '
+                f'p99 {result["p99_ms"]:>8.2f}ms')
+        if output:
+            write_results(output, results)
+            click.echo(Created(f'Results written to {output}.'))
+    except Exception as e:
+        click.echo(Aborted(f'Soak produce the following error: {e}.'))
+        raise SystemExit(1)
+    if results['violations']:
+        for violation in results['violations']:
+            click.echo(Aborted(violation))
+        raise SystemExit(1)
+    click.echo(Initialized(
+        f'{results["meta"]["issued"]} tokens issued, '
+        f'{results["meta"]["revoked"]} revoked, no check failed.'))
+
 @ cli.command()
 @ click.option(
     '-n',
@@ -1,18 +1,23 @@
 from flask import Flask
 from settings.settings import DevelopmentConfig
-from settings.database import session
-from settings.logger_config import LOGGING
+from settings.database import (
+    session,
+    init_engine,
+    replica_sync,
+    database_writer
+)
+from settings.logger_config import configure_logging
 from flask_jwt_extended import JWTManager
 from flask_bcrypt import Bcrypt
-import logging
-import logging.config
+from utils.hashing import PasswordHasher
 
 
 # APPLICATION CONFIGURATION
 
-logging.config.dictConfig(LOGGING)
+configure_logging()
 
 bcrypt = Bcrypt()
+hasher = PasswordHasher()
 jwt = JWTManager()
 
 
@@ -20,13 +25,18 @@ def create_app(config=None):
 
     app = Flask(__name__, instance_relative_config=True)
 
-    bcrypt.init_app(app)
-
     if config:
         app.config.from_object(config)
     else:
         app.config.from_object(DevelopmentConfig())
 
+    init_engine(app.config)
+    replica_sync.init_app(app)
+    database_writer.init_app(app)
+
+    bcrypt.init_app(app)
+    hasher.init_app(app)
+
     # jwt = JWTManager(app)
     jwt.init_app(app)
 
@@ -34,11 +44,36 @@ def create_app(config=None):
 
     from workforce.workforce import workforce
     from authentication.authentication import authentication
+    from monitoring.monitoring import monitoring
+    from utils.blacklist_helpers import (
+        token_cache,
+        token_pruner,
+        token_recorder
+    )
+    from authentication.context import clear_auth_context
+    from utils.instrumentation import sql_instrumentation
+    from utils.decorators import error_aggregator
+    from utils.metrics import metrics
+    from utils.tracing import tracer
+    from utils.profiling import profiler
+    from utils.memory import memory_tracker
+
+    token_cache.init_app(app)
+    token_pruner.init_app(app)
+    token_recorder.init_app(app)
+    app.before_request(clear_auth_context)
+    sql_instrumentation.init_app(app)
+    error_aggregator.init_app(app)
+    metrics.init_app(app)
+    tracer.init_app(app)
+    profiler.init_app(app)
+    memory_tracker.init_app(app)
 
     # BLUEPRINT
 
     app.register_blueprint(authentication,  url_prefix='/authentication')
     app.register_blueprint(workforce,  url_prefix='/workforce')
+    app.register_blueprint(monitoring,  url_prefix='/monitoring')
 
     @app.teardown_appcontext
     def shutdown_session(exception=None):
@@ -0,0 +1,22 @@
+"""Index tokens on jti, user_identity and expires.
+
+Every protected request filters by `jti`, `get_user_tokens` by
+`user_identity` and `prune_database` by `expires`.
+"""
+from settings.migrations import create_index, drop_index
+
+INDEXES = [
+    ('ix_tokens_jti', 'tokens', ['jti']),
+    ('ix_tokens_user_identity', 'tokens', ['user_identity']),
+    ('ix_tokens_expires', 'tokens', ['expires']),
+]
+
+
+def upgrade(connection):
+    for name, table, columns in INDEXES:
+        create_index(connection, name, table, columns)
+
+
+def downgrade(connection):
+    for name, table, columns in INDEXES:
+        drop_index(connection, name, table)
@@ -0,0 +1,137 @@
+from flask import Blueprint, Response, request, jsonify
+from flask_jwt_extended import jwt_required
+from authentication.permissions import admin_required
+from utils.decorators import ErrorHandler
+from utils.errors import ConflictError
+from utils.log_handlers import logging_stats
+from utils.memory import memory_tracker
+from utils.metrics import metrics
+from utils.profiling import profiler
+from flask_cors import CORS
+import logging
+
+
+monitoring = Blueprint('monitoring', __name__, template_folder='templates')
+
+CORS(monitoring)
+
+logger = logging.getLogger('app')
+
+
+@metrics.collector
+def logging_metrics():
+    lines = [
+        '# HELP log_records_dropped_total Log records dropped on a full queue.',
+        '# TYPE log_records_dropped_total counter',
+    ]
+    stats = logging_stats()
+    for name, logger_stats in sorted(stats.items()):
+        lines.append(
+            f'log_records_dropped_total{{logger="{name}"}} {logger_stats["dropped"]}')
+    lines += [
+        '# HELP log_records_queued Log records waiting to be written.',
+        '# TYPE log_records_queued gauge',
+    ]
+    for name, logger_stats in sorted(stats.items()):
+        lines.append(
+            f'log_records_queued{{logger="{name}"}} {logger_stats["queued"]}')
+    return lines
+
+
+# Create your end-points here.
+
+
+# Prometheus scrape target
+
+
+@monitoring.route('/metrics', methods=['GET'])
+@jwt_required
+@ErrorHandler(logger, monitoring)
+@admin_required
+def get_metrics():
+    response = Response(
+        metrics.render(), mimetype='text/plain; version=0.0.4')
+    return response, 200
+
+
+# Aggregated profiles, see utils.profiling
+
+
+@monitoring.route('/profile', methods=['GET'])
+@jwt_required
+@ErrorHandler(logger, monitoring)
+@admin_required
+def get_profiles():
+    return jsonify(profiler.summary()), 200
+
+
+@monitoring.route('/profile/<endpoint>', methods=['GET'])
+@jwt_required
+@ErrorHandler(logger, monitoring)
+@admin_required
+def get_profile(endpoint):
+    profile = profiler.get(endpoint)
+    if profile is None:
+        raise ConflictError(user_err_msg=f'No profile for {endpoint}.')
+    output = request.args.get('format', default='collapsed', type=str)
+    if output == 'pstats':
+        response = Response(profile.pstats(),
+                            mimetype='application/octet-stream')
+        response.headers['Content-Disposition'] = \
+            f'attachment; filename={endpoint}.pstats'
+    elif output == 'collapsed':
+        response = Response(profile.collapsed(), mimetype='text/plain')
+    elif output == 'text':
+        response = Response(profile.top(
+            limit=request.args.get('top', default=30, type=int)), mimetype='text/plain')
+    else:
+        raise ConflictError(
+            user_err_msg='format must be pstats, collapsed or text.')
+    return response, 200
+
+
+@monitoring.route('/profile', methods=['DELETE'])
+@jwt_required
+@ErrorHandler(logger, monitoring)
+@admin_required
+def delete_profiles():
+    profiler.reset()
+    return jsonify(profiler.summary()), 200
+
+
+# Allocations, see utils.memory
+
+
+@monitoring.route('/memory', methods=['GET'])
+@jwt_required
+@ErrorHandler(logger, monitoring)
+@admin_required
+def get_memory():
+    return jsonify(memory_tracker.summary()), 200
+
+
+@monitoring.route('/memory/snapshot', methods=['POST'])
+@jwt_required
+@ErrorHandler(logger, monitoring)
+@admin_required
+def memory_snapshot():
+    if not memory_tracker.enabled:
+        raise ConflictError(user_err_msg='Memory tracking is disabled.')
+    group = request.args.get('group', default='lineno', type=str)
+    if group not in ('lineno', 'filename', 'traceback'):
+        raise ConflictError(
+            user_err_msg='group must be lineno, filename or traceback.')
+    sites = memory_tracker.snapshot(
+        limit=request.args.get('top', default=None, type=int),
+        key_type=group,
+        pattern=request.args.get('filename', default=None, type=str))
+    return jsonify(sites), 200
+
+
+@monitoring.route('/memory', methods=['DELETE'])
+@jwt_required
+@ErrorHandler(logger, monitoring)
+@admin_required
+def delete_memory():
+    memory_tracker.reset()
+    return jsonify(memory_tracker.summary()), 200
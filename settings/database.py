@@ -1,24 +1,85 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker
+from contextlib import contextmanager
+from itertools import cycle
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.orm import Session, scoped_session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import NullPool, QueuePool, SingletonThreadPool, StaticPool
+from sqlalchemy.sql.dml import UpdateBase
+from utils.instrumentation import record_query
+from utils.scheduler import PeriodicTask
+from utils.writer import SingleWriter
 import os
+import sqlite3
+import time
 from pathlib import Path
 
 SETTING_PATH = Path(os.path.dirname(os.path.abspath(__file__))).parent
 
 database = "sqlite:///" + os.path.join(SETTING_PATH, 'db.sqlite')
 
-engine = create_engine(
-    database,
-    convert_unicode=False,
-    connect_args={'check_same_thread': False}
-)
+POOL_CLASSES = {
+    'QueuePool': QueuePool,
+    'NullPool': NullPool,
+    'SingletonThreadPool': SingletonThreadPool,
+    'StaticPool': StaticPool,
+}
+
+# Built by `init_engine`, called from create_app.
+engine = None
+# Read-only engines of `DATABASE_REPLICA_URLS`, see `replica_reads`.
+replicas = list()
+_next_replica = None
+
+
+class RoutingSession(Session):
+    """Session that sends its reads to the replicas inside `replica_reads`.
+
+    Flushes, INSERT/UPDATE/DELETE statements and every read that follows
+    the first write of the session go to the primary, so a request always
+    reads its own writes. The scoped session is removed at the end of each
+    request, which starts the next one on the replicas again.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.replica_depth = 0
+        self.wrote = False
+
+    def get_bind(self, mapper=None, clause=None):
+        if isinstance(clause, UpdateBase):
+            self.wrote = True
+        elif self.replica_depth and replicas and not self.wrote \
+                and not self._flushing:
+            return next(_next_replica)
+        return super().get_bind(mapper, clause)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def after_flush(current_session, flush_context):
+    current_session.wrote = True
+
+
+@contextmanager
+def replica_reads():
+    """
+    The queries of `session` run inside the block (or the decorated
+    function) read from a replica, unless the session already wrote.
+    Without replicas it does nothing.
+    """
+    current_session = session()
+    current_session.replica_depth += 1
+    try:
+        yield current_session
+    finally:
+        current_session.replica_depth -= 1
+
 
 session = scoped_session(
     sessionmaker(
+        class_=RoutingSession,
         autocommit=False,
-        autoflush=False,
-        bind=engine
+        autoflush=False
     )
 )
 
@@ -26,15 +87,174 @@ Base = declarative_base()
 Base.query = session.query_property()
 
 
-def init_db():
+def engine_options(config) -> tuple:
+    """
+    URL and `create_engine` arguments from the `DATABASE_*` settings. SQLite files
+    default to a `QueuePool` so `DATABASE_POOL_SIZE` can match the number of
+    worker threads; in-memory databases share one connection through a
+    `StaticPool`, each new connection would open an empty database.
+    """
+    url = make_url(config.get('DATABASE_URL') or database)
+    options = dict(
+        convert_unicode=False,
+        pool_pre_ping=bool(config.get('DATABASE_POOL_PRE_PING', False)),
+        pool_recycle=int(config.get('DATABASE_POOL_RECYCLE', -1)),
+    )
+    pool_class = config.get('DATABASE_POOL_CLASS')
+    if url.drivername.startswith('sqlite'):
+        in_memory = url.database in (None, '', ':memory:')
+        options['connect_args'] = {
+            'check_same_thread': False,
+            # Seconds, the driver turns it into the SQLite busy timeout.
+            'timeout': int(config.get('SQLITE_BUSY_TIMEOUT', 5000)) / 1000,
+        }
+        pool_class = pool_class or ('StaticPool' if in_memory else 'QueuePool')
+    if pool_class:
+        if pool_class not in POOL_CLASSES:
+            raise ValueError(
+                f'DATABASE_POOL_CLASS {pool_class!r} is not one of '
+                f'{", ".join(POOL_CLASSES)}.')
+        options['poolclass'] = POOL_CLASSES[pool_class]
+    if options.get('poolclass', QueuePool) is QueuePool:
+        options['pool_size'] = int(config.get('DATABASE_POOL_SIZE', 5))
+        options['max_overflow'] = int(config.get('DATABASE_MAX_OVERFLOW', 10))
+        options['pool_timeout'] = float(config.get('DATABASE_POOL_TIMEOUT', 30))
+    return url, options
+
+
+def build_engine(config, url=None):
+    url, options = engine_options(dict(config, DATABASE_URL=url) if url else config)
+    new_engine = create_engine(url, **options)
+    instrument_engine(new_engine)
+    if url.drivername.startswith('sqlite'):
+        tune_sqlite(new_engine, config)
+    return new_engine
+
+
+def init_engine(config):
+    """
+    Builds the engine from `config` (the app config or any mapping with the
+    `DATABASE_*` and `SQLITE_*` settings) and binds `session` to it, plus
+    one engine per url of `DATABASE_REPLICA_URLS` (comma separated). The
+    previous engines, if any, are disposed.
+    """
+    global engine, _next_replica
+    if engine is not None:
+        session.remove()
+        for old_engine in [engine] + replicas:
+            old_engine.dispose()
+    engine = build_engine(config)
+    replicas[:] = [
+        build_engine(config, url.strip())
+        for url in (config.get('DATABASE_REPLICA_URLS') or '').split(',')
+        if url.strip()
+    ]
+    _next_replica = cycle(replicas)
+    session.configure(bind=engine)
+    return engine
+
+
+def get_engine():
+    """The current engine, built from the default settings if `init_engine`
+    was not called yet (CLI commands)."""
+    if engine is None:
+        from flask import Config
+        from settings.settings import DevelopmentConfig
+        config = Config(SETTING_PATH)
+        config.from_object(DevelopmentConfig())
+        init_engine(config)
+    return engine
+
+
+def tune_sqlite(engine, config):
+    """Sets the SQLite pragmas on every new connection. WAL lets readers run
+    alongside the single writer and the busy timeout makes writers wait for
+    the lock instead of failing with "database is locked"."""
+    pragmas = [
+        ('journal_mode', config.get('SQLITE_JOURNAL_MODE', 'WAL')),
+        ('synchronous', config.get('SQLITE_SYNCHRONOUS', 'NORMAL')),
+        ('cache_size', config.get('SQLITE_CACHE_SIZE', -64000)),
+        ('mmap_size', config.get('SQLITE_MMAP_SIZE', 268435456)),
+        ('busy_timeout', config.get('SQLITE_BUSY_TIMEOUT', 5000)),
+    ]
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            if value is not None and value != '':
+                cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+def sync_sqlite_replicas() -> int:
+    """
+    Copies the primary SQLite database over every SQLite replica with the
+    online backup API. The copy locks each replica while it runs, its
+    readers wait or get `database is locked` past their busy timeout. Meant
+    for local replicas made of file copies. Returns the number of replicas
+    copied.
+    """
+    copied = 0
+    source = get_engine().raw_connection()
+    try:
+        for replica in replicas:
+            if replica.url.drivername.startswith('sqlite') and replica.url.database:
+                target = sqlite3.connect(replica.url.database)
+                try:
+                    source.connection.backup(target)
+                finally:
+                    target.close()
+                copied += 1
+    finally:
+        source.close()
+    return copied
+
+
+# Refreshes the file-copy replicas every `DATABASE_REPLICA_SYNC_INTERVAL`.
+replica_sync = PeriodicTask(sync_sqlite_replicas, 'DATABASE_REPLICA_SYNC')
+
+
+def instrument_engine(engine):
+    """Query count and time of each request, see utils.instrumentation"""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        record_query(statement, time.perf_counter() - conn.info['query_start'].pop())
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context):
+        if context.connection is not None and context.connection.info.get('query_start'):
+            context.connection.info['query_start'].pop()
+
+
+# Write serialization, see `SingleWriter`. Configured from `DATABASE_WRITER_*`.
+database_writer = SingleWriter(session, get_engine, 'DATABASE_WRITER')
+
+
+def _import_models():
     # import all modules here that might define models so that
     # they will be registered properly on the metadata.  Otherwise
     # you will have to import them first before calling init_db()
     import utils.models
     import workforce.models
     import authentication.models
-    Base.metadata.create_all(bind=engine)
+    # Defines the schema_migrations table.
+    import settings.migrations
+    return settings.migrations
+
+
+def init_db():
+    migrations = _import_models()
+    Base.metadata.create_all(bind=get_engine())
+    # create_all already builds the latest schema.
+    migrations.stamp(bind=get_engine())
 
 
 def drop_db():
-    Base.metadata.drop_all(bind=engine)
+    _import_models()
+    Base.metadata.drop_all(bind=get_engine())
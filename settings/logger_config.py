@@ -1,7 +1,6 @@
 import logging
 import logging.config
 import os
-import shutil
 from pathlib import Path
 
 SETTING_PATH = Path(os.path.dirname(os.path.abspath(__file__))).parent
@@ -10,6 +9,31 @@ FILENAME_LOGGER = os.path.join(SETTING_PATH, 'stdout', 'logger.log')
 FILENAME_LOGGER_ERROR = os.path.join(
     SETTING_PATH,  'stdout', 'logger-errors.log')
 
+# Files are written by a background thread, see `configure_logging`.
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE') or 10000)
+# 'size' rotates at LOG_MAX_BYTES, 'time' every LOG_ROTATE_WHEN.
+LOG_ROTATION = os.getenv('LOG_ROTATION') or 'size'
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES') or 10 * 1024 * 1024)
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN') or 'midnight'
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT') or 5)
+LOG_COMPRESS = (os.getenv('LOG_COMPRESS') or 'True') == 'True'
+
+if LOG_ROTATION == 'time':
+    ROTATION = {
+        'class': 'utils.log_handlers.CompressedTimedRotatingFileHandler',
+        'when': LOG_ROTATE_WHEN,
+        'backupCount': LOG_BACKUP_COUNT,
+        'compress': LOG_COMPRESS,
+    }
+else:
+    ROTATION = {
+        'class': 'utils.log_handlers.CompressedRotatingFileHandler',
+        'mode': 'a',
+        'maxBytes': LOG_MAX_BYTES,
+        'backupCount': LOG_BACKUP_COUNT,
+        'compress': LOG_COMPRESS,
+    }
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -21,15 +45,13 @@ LOGGING = {
     },
     'handlers': {
         'extras_handler': {
-            'class': 'logging.FileHandler',
+            **ROTATION,
             'formatter': 'detailed',
-            'mode': 'a',
             'filename': FILENAME_LOGGER
         },
         'errors': {
-            'class': 'logging.FileHandler',
+            **ROTATION,
             'filename': FILENAME_LOGGER_ERROR,
-            'mode': 'a',
             'level': 'ERROR',
             'formatter': 'detailed',
         },
@@ -44,3 +66,14 @@ LOGGING = {
         'handlers': ['errors']
     },
 }
+
+
+def configure_logging():
+    """
+    Applies `LOGGING`, then puts the file handlers behind a bounded queue so
+    requests never wait for the disk. Records that do not fit in the queue
+    are dropped and counted, see `utils.log_handlers.logging_stats`.
+    """
+    from utils.log_handlers import start_queue_logging
+    logging.config.dictConfig(LOGGING)
+    start_queue_logging(['app', ''], max_size=LOG_QUEUE_SIZE)
@@ -0,0 +1,147 @@
+import datetime
+import importlib
+import os
+import re
+from pathlib import Path
+from sqlalchemy import Table, Column, String, DateTime, inspect
+from settings.database import Base, get_engine
+
+SETTING_PATH = Path(os.path.dirname(os.path.abspath(__file__))).parent
+
+MIGRATIONS_PATH = os.path.join(SETTING_PATH, 'migrations')
+MIGRATION_NAME = re.compile(r'^(\d{4})_\w+\.py$')
+
+# Registered on the models metadata so init_db/drop_db manage it too.
+schema_migrations = Table(
+    'schema_migrations',
+    Base.metadata,
+    Column('name', String(100), primary_key=True),
+    Column('applied', DateTime, nullable=False)
+)
+
+
+class Migration:
+    """A numbered module of `migrations/` exposing `upgrade(connection)` and
+    `downgrade(connection)`.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._module = None
+
+    @property
+    def module(self):
+        if self._module is None:
+            self._module = importlib.import_module(f'migrations.{self.name}')
+        return self._module
+
+    @property
+    def description(self):
+        return (self.module.__doc__ or '').strip().split('\n')[0]
+
+    def upgrade(self, connection):
+        self.module.upgrade(connection)
+
+    def downgrade(self, connection):
+        self.module.downgrade(connection)
+
+    def __repr__(self):
+        return f'<Migration {self.name}>'
+
+
+def load_migrations():
+    names = sorted(
+        filename[:-3] for filename in os.listdir(MIGRATIONS_PATH)
+        if MIGRATION_NAME.match(filename)
+    )
+    return [Migration(name) for name in names]
+
+
+def applied_migrations(connection):
+    schema_migrations.create(bind=connection, checkfirst=True)
+    rows = connection.execute(schema_migrations.select()).fetchall()
+    return {row['name'] for row in rows}
+
+
+def show_migrations(bind=None):
+    """Returns a list of (migration, applied) pairs in apply order."""
+    bind = bind or get_engine()
+    with bind.begin() as connection:
+        applied = applied_migrations(connection)
+    return [(migration, migration.name in applied)
+            for migration in load_migrations()]
+
+
+def migrate(target=None, bind=None):
+    """
+    Applies the pending migrations in order, up to and including `target`
+    when given. Each migration runs in its own transaction together with its
+    bookkeeping row, so a failure leaves the database at the last good step.
+    """
+    bind = bind or get_engine()
+    done = list()
+    with bind.begin() as connection:
+        applied = applied_migrations(connection)
+    for migration in load_migrations():
+        if migration.name not in applied:
+            with bind.begin() as connection:
+                migration.upgrade(connection)
+                connection.execute(schema_migrations.insert().values(
+                    name=migration.name, applied=datetime.datetime.now()))
+            done.append(migration)
+        if target and migration.name.startswith(target):
+            break
+    return done
+
+
+def rollback(steps=1, bind=None):
+    """Reverts the latest `steps` applied migrations."""
+    bind = bind or get_engine()
+    done = list()
+    with bind.begin() as connection:
+        applied = applied_migrations(connection)
+    candidates = [migration for migration in reversed(load_migrations())
+                  if migration.name in applied]
+    for migration in candidates[:steps]:
+        with bind.begin() as connection:
+            migration.downgrade(connection)
+            connection.execute(schema_migrations.delete().where(
+                schema_migrations.c.name == migration.name))
+        done.append(migration)
+    return done
+
+
+def stamp(bind=None):
+    """
+    Marks every migration as applied without running it. Used after
+    `create_all`, which already builds the latest schema.
+    """
+    bind = bind or get_engine()
+    with bind.begin() as connection:
+        applied = applied_migrations(connection)
+        for migration in load_migrations():
+            if migration.name not in applied:
+                connection.execute(schema_migrations.insert().values(
+                    name=migration.name, applied=datetime.datetime.now()))
+
+
+# Helpers for migration modules.
+
+
+def has_index(connection, table, name):
+    return any(index['name'] == name
+               for index in inspect(connection).get_indexes(table))
+
+
+def create_index(connection, name, table, columns, unique=False):
+    if not has_index(connection, table, name):
+        quote = connection.dialect.identifier_preparer.quote
+        connection.execute(
+            f'CREATE {"UNIQUE " if unique else ""}INDEX {quote(name)} '
+            f'ON {quote(table)} ({", ".join(quote(column) for column in columns)})')
+
+
+def drop_index(connection, name, table):
+    if has_index(connection, table, name):
+        quote = connection.dialect.identifier_preparer.quote
+        connection.execute(f'DROP INDEX {quote(name)}')
@@ -19,6 +19,51 @@ class Config(object):
     JWT_BLACKLIST_ENABLED = os.getenv('JWT_BLACKLIST_ENABLED')
     ALLOWED_EXTENSIONS = os.getenv('ALLOWED_EXTENSIONS') or [
         'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif']
+    DATABASE_URL = os.getenv('DATABASE_URL') or 'sqlite:///' + path.join(
+        path.dirname(BASEDIR), 'db.sqlite')
+    DATABASE_REPLICA_URLS = os.getenv('DATABASE_REPLICA_URLS')
+    DATABASE_REPLICA_SYNC_INTERVAL = float(
+        os.getenv('DATABASE_REPLICA_SYNC_INTERVAL') or 0)
+    DATABASE_WRITER_ENABLED = (os.getenv('DATABASE_WRITER_ENABLED') or 'False') == 'True'
+    DATABASE_WRITER_MAX_BATCH = int(os.getenv('DATABASE_WRITER_MAX_BATCH') or 50)
+    DATABASE_WRITER_MAX_DELAY = float(
+        os.getenv('DATABASE_WRITER_MAX_DELAY') or 0.002)
+    DATABASE_WRITER_TIMEOUT = float(os.getenv('DATABASE_WRITER_TIMEOUT') or 30)
+    DATABASE_POOL_CLASS = os.getenv('DATABASE_POOL_CLASS')
+    DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE') or 5)
+    DATABASE_MAX_OVERFLOW = int(os.getenv('DATABASE_MAX_OVERFLOW') or 10)
+    DATABASE_POOL_TIMEOUT = float(os.getenv('DATABASE_POOL_TIMEOUT') or 30)
+    DATABASE_POOL_RECYCLE = int(os.getenv('DATABASE_POOL_RECYCLE') or -1)
+    DATABASE_POOL_PRE_PING = (os.getenv('DATABASE_POOL_PRE_PING') or 'False') == 'True'
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE') or 'WAL'
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS') or 'NORMAL'
+    SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE') or -64000)
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE') or 268435456)
+    SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT') or 5000)
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS') or 10)
+    BCRYPT_POOL_SIZE = int(os.getenv('BCRYPT_POOL_SIZE') or os.cpu_count() or 1)
+    BCRYPT_QUEUE_DEPTH = int(os.getenv('BCRYPT_QUEUE_DEPTH') or 32)
+    BCRYPT_RETRY_AFTER = int(os.getenv('BCRYPT_RETRY_AFTER') or 1)
+    TOKEN_CACHE_MAX_SIZE = int(os.getenv('TOKEN_CACHE_MAX_SIZE') or 10000)
+    TOKEN_CACHE_TTL = float(os.getenv('TOKEN_CACHE_TTL') or 10)
+    TOKEN_PRUNE_INTERVAL = float(os.getenv('TOKEN_PRUNE_INTERVAL') or 0)
+    TOKEN_PRUNE_BATCH_SIZE = int(os.getenv('TOKEN_PRUNE_BATCH_SIZE') or 1000)
+    TOKEN_PRUNE_PAUSE = float(os.getenv('TOKEN_PRUNE_PAUSE') or 0.05)
+    TOKEN_RECORDER_MAX_BATCH = int(os.getenv('TOKEN_RECORDER_MAX_BATCH') or 1)
+    TOKEN_RECORDER_MAX_DELAY = float(
+        os.getenv('TOKEN_RECORDER_MAX_DELAY') or 0.005)
+    SQL_INSTRUMENTATION = (os.getenv('SQL_INSTRUMENTATION') or 'True') == 'True'
+    TRACING_SAMPLE_RATE = float(os.getenv('TRACING_SAMPLE_RATE') or 0.1)
+    TRACING_SLOW_THRESHOLD = float(os.getenv('TRACING_SLOW_THRESHOLD') or 0.5)
+    PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE') or 0)
+    PROFILING_HEADER = os.getenv('PROFILING_HEADER') or 'X-Profile'
+    PROFILING_INTERVAL = float(os.getenv('PROFILING_INTERVAL') or 0.005)
+    MEMORY_TRACKING = (os.getenv('MEMORY_TRACKING') or 'False') == 'True'
+    MEMORY_TRACKING_FRAMES = int(os.getenv('MEMORY_TRACKING_FRAMES') or 10)
+    MEMORY_TRACKING_TOP = int(os.getenv('MEMORY_TRACKING_TOP') or 20)
+    METRICS_ENABLED = (os.getenv('METRICS_ENABLED') or 'True') == 'True'
+    ERROR_AGGREGATION_WINDOW = float(os.getenv('ERROR_AGGREGATION_WINDOW') or 60)
+    SQL_REPEAT_THRESHOLD = int(os.getenv('SQL_REPEAT_THRESHOLD') or 10)
 
 
 class ProductionConfig(Config):
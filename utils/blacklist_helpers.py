@@ -1,11 +1,41 @@
+import base64
+import json
+import time
 from datetime import datetime
 
+from sqlalchemy import select
 from sqlalchemy.orm.exc import NoResultFound
-from flask_jwt_extended import decode_token
 
 from .errors import TokenNotFound
+from .cache import TTLCache
+from .scheduler import PeriodicTask
+from .buffers import WriteBehindBuffer
 from authentication.models import TokenBlacklist
-from settings.database import session
+from settings.database import (
+    session,
+    get_engine,
+    replica_reads,
+    database_writer
+)
+
+# jti -> revoked flag. Configured from `TOKEN_CACHE_*` settings in create_app.
+token_cache = TTLCache(max_size=10000, ttl=10, prefix='TOKEN_CACHE')
+
+
+def _forget_tokens(rows):
+    for row in rows:
+        token_cache.invalidate(row['jti'])
+
+
+# Issued tokens waiting to be inserted, see `add_token_to_database`.
+token_recorder = WriteBehindBuffer(
+    TokenBlacklist.__table__,
+    'jti',
+    get_engine,
+    'TOKEN_RECORDER',
+    on_error=_forget_tokens,
+    writer=database_writer
+)
 
 
 def _epoch_utc_to_datetime(epoch_utc):
@@ -16,34 +46,51 @@ def _epoch_utc_to_datetime(epoch_utc):
     return datetime.fromtimestamp(epoch_utc)
 
 
-def add_token_to_database(encoded_token, identity_claim):
+def read_token_claims(encoded_token):
+    """
+    Returns the claims of a token we have just created. The signature was
+    made by us a moment ago, so unlike `decode_token` it is not verified.
+    """
+    payload = encoded_token.split('.')[1]
+    payload += '=' * (-len(payload) % 4)
+    return json.loads(base64.urlsafe_b64decode(payload))
+
+
+def add_token_to_database(decoded_token, identity_claim):
     """
     Adds a new token to the database. It is not revoked when it is added.
+    The row goes through `token_recorder`, which by default inserts it
+    right away and raises if the insert fails. With a
+    `TOKEN_RECORDER_MAX_BATCH` over 1 issued tokens are inserted in batches
+    and, until then, only known to this process through the recorder and
+    `token_cache`: other processes reject them.
+    :param decoded_token: claims of the new token, see `read_token_claims`.
     :param identity_claim:
     """
-    decoded_token = decode_token(encoded_token)
     jti = decoded_token['jti']
-    token_type = decoded_token['type']
-    user_identity = decoded_token[identity_claim]
-    expires = _epoch_utc_to_datetime(decoded_token['exp'])
     revoked = False
 
-    db_token = TokenBlacklist(
+    token_recorder.add(dict(
         jti=jti,
-        token_type=token_type,
-        user_identity=user_identity['username'],
-        expires=expires,
+        token_type=decoded_token['type'],
+        user_identity=decoded_token[identity_claim]['username'],
+        expires=_epoch_utc_to_datetime(decoded_token['exp']),
         revoked=revoked,
-    )
-    session.add(db_token)
-    session.commit()
+    ))
+    token_cache.set(jti, revoked)
 
 
-def get_token(decoded_token):
+def get_token(decoded_token, replica: bool = True):
+    """
+    Returns the stored token, None when unknown. With `replica` the lookup
+    runs on a read replica, see `settings.database.replica_reads`.
+    """
     try:
         jti = decoded_token['jti']
-        token = TokenBlacklist.query.filter_by(jti=jti).one()
-        return token
+        if replica:
+            with replica_reads():
+                return TokenBlacklist.query.filter_by(jti=jti).one()
+        return TokenBlacklist.query.filter_by(jti=jti).one()
     except NoResultFound:
         return None
 
@@ -54,11 +101,24 @@ def is_token_revoked(decoded_token):
     tokens that we create into this database, if the token is not present
     in the database we are going to consider it revoked, as we don't know where
     it was created.
+    The verdict is cached by `jti` in `token_cache`, so only the first check
+    of a token in the cache window reaches the database.
     """
-    token = get_token(decoded_token)
+    jti = decoded_token['jti']
+    revoked = token_cache.get(jti)
+    if revoked is not None:
+        return revoked
+    pending = token_recorder.get(jti)
+    if pending is not None:
+        return pending['revoked']
+    # Never from a replica: a lagging one still has revoked tokens as valid.
+    token = get_token(decoded_token, replica=False)
     if token:
+        # `add`, not `set`: a revocation committed after this read has
+        # already cached its verdict, the value read here is stale.
+        token_cache.add(jti, token.revoked)
         return token.revoked
-    return false
+    return True
 
 
 def get_user_tokens(user_identity):
@@ -66,6 +126,7 @@ def get_user_tokens(user_identity):
     Returns all of the tokens, revoked and unrevoked, that are stored for the
     given user
     """
+    token_recorder.flush()
     return TokenBlacklist.query.filter_by(user_identity=user_identity['username']).all()
 
 
@@ -74,6 +135,7 @@ def revoke_token(user, jti: str = None, token_id: int = None):
     Revokes the given token. Raises a TokenNotFound error if the token does
     not exist in the database
     """
+    token_recorder.flush()
     try:
         if token_id:
             token = TokenBlacklist.query.filter_by(
@@ -86,7 +148,8 @@ def revoke_token(user, jti: str = None, token_id: int = None):
                 user_identity=user['username']
             ).one()
         token.revoked = True
-        session.commit()
+        database_writer.save(token)
+        token_cache.set(token.jti, True)
     except NoResultFound:
         raise TokenNotFound(
             user_err_msg=f"Could not find the token {token_id}")
@@ -97,25 +160,60 @@ def unrevoke_token(token_id, user):
     Unrevokes the given token. Raises a TokenNotFound error if the token does
     not exist in the database
     """
+    token_recorder.flush()
     try:
         token = TokenBlacklist.query.filter_by(
             id=token_id, user_identity=user['username']).one()
         token.revoked = False
-        session.commit()
+        database_writer.save(token)
+        token_cache.set(token.jti, False)
     except NoResultFound:
         raise TokenNotFound("Could not find the token {}".format(token_id))
 
 
-# TODO MAKE AN CRON TASK
-def prune_database():
+def prune_database(batch_size: int = 1000, pause: float = 0.05) -> int:
     """
     Delete tokens that have expired from the database.
-    How (and if) you call this is entirely up you. You could expose it to an
-    endpoint that only administrators could call, you could run it as a cron,
-    set it up with flask cli, etc.
+    Rows are removed with set-based `DELETE` statements of at most
+    `batch_size` rows, each one committed on its own and followed by a
+    `pause` in seconds, so the write lock is never held for long.
+    Returns the number of deleted tokens. Besides the `prune-tokens` command
+    it runs periodically through `token_pruner` when `TOKEN_PRUNE_INTERVAL`
+    is set.
     """
+    _check_prune_options(batch_size=batch_size)
     now = datetime.now()
-    expired = TokenBlacklist.query.filter(TokenBlacklist.expires < now).all()
-    for token in expired:
-        session.delete(token)
-    session.commit()
+    tokens = TokenBlacklist.__table__
+    expired = select([tokens.c.id, tokens.c.jti]).where(
+        tokens.c.expires < now).limit(batch_size)
+    total = 0
+    while True:
+        rows = session.execute(expired).fetchall()
+        if rows:
+            session.execute(tokens.delete().where(
+                tokens.c.id.in_([row['id'] for row in rows])))
+        session.commit()
+        # Only the verdicts of the deleted tokens, the others stay cached.
+        _forget_tokens(rows)
+        total += len(rows)
+        if len(rows) < batch_size:
+            break
+        time.sleep(pause)
+    return total
+
+
+def _check_prune_options(batch_size, **options):
+    # A batch under 1 never ends the loop, and SQLite reads LIMIT -1 as
+    # no limit at all.
+    if batch_size < 1:
+        raise ValueError(f'batch_size must be at least 1, not {batch_size}')
+
+
+token_pruner = PeriodicTask(
+    prune_database,
+    'TOKEN_PRUNE',
+    teardown=session.remove,
+    check=_check_prune_options,
+    batch_size=1000,
+    pause=0.05
+)
@@ -0,0 +1,122 @@
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger('app')
+
+
+class WriteBehindBuffer:
+    """Buffers rows of `table` in memory and inserts them in batches.
+
+    A daemon thread writes the buffer in one transaction once it holds
+    `<PREFIX>_MAX_BATCH` rows or its oldest row is `<PREFIX>_MAX_DELAY`
+    seconds old. Rows stay readable through `get(key)` until their
+    transaction is committed. A batch size of 1, the default, writes every
+    row through on the caller's thread and raises its errors.
+    `bind` is an engine or a function returning one. With an enabled
+    `writer`, a `SingleWriter`, the inserts go through it instead so they
+    do not compete with its writes for the database lock.
+    """
+
+    def __init__(self, table, key, bind, prefix, max_batch=1,
+                 max_delay=0.005, on_error=None, writer=None):
+        self.table = table
+        self.key = key
+        self.bind = bind
+        self.writer = writer
+        self.prefix = prefix
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.on_error = on_error
+        self._rows = OrderedDict()
+        self._inflight = dict()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        atexit.register(self.close)
+
+    def init_app(self, app):
+        self.max_batch = int(app.config.get(
+            f'{self.prefix}_MAX_BATCH', self.max_batch))
+        self.max_delay = float(app.config.get(
+            f'{self.prefix}_MAX_DELAY', self.max_delay))
+
+    def add(self, row):
+        if self.max_batch <= 1:
+            self._insert([row])
+            return
+        with self._cond:
+            self._rows[row[self.key]] = row
+            self._cond.notify()
+        if self._thread is None or not self._thread.is_alive():
+            self._start()
+
+    def get(self, key):
+        with self._cond:
+            return self._rows.get(key) or self._inflight.get(key)
+
+    def flush(self):
+        """Writes the buffered rows now. Returns how many were written."""
+        with self._flush_lock:
+            with self._cond:
+                if not self._rows:
+                    return 0
+                batch, self._rows = self._rows, OrderedDict()
+                self._inflight = batch
+            try:
+                self._write(list(batch.values()))
+            finally:
+                with self._cond:
+                    self._inflight = dict()
+            return len(batch)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self.flush()
+
+    def _insert(self, rows):
+        if self.writer is not None and self.writer.enabled:
+            self.writer.run(
+                lambda session: session.execute(self.table.insert(), rows))
+            return
+        bind = self.bind() if callable(self.bind) else self.bind
+        with bind.begin() as connection:
+            connection.execute(self.table.insert(), rows)
+
+    def _write(self, rows):
+        try:
+            self._insert(rows)
+        except Exception as e:
+            logger.log(logging.ERROR, f'{self.prefix}: {len(rows)} rows lost {e!r}',
+                       extra=dict(bp='write-behind'))
+            if self.on_error:
+                self.on_error(rows)
+
+    def _start(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._closed = False
+            self._thread = threading.Thread(
+                target=self._run, name=self.prefix.lower(), daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._rows and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                deadline = time.monotonic() + self.max_delay
+                while len(self._rows) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            self.flush()
@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Bounded in-process LRU cache whose entries expire after `ttl` seconds.
+
+    Like the flask extensions, an instance is created at module level and
+    configured later through `init_app`. A `max_size` or `ttl` of 0 disables
+    the cache, every lookup is then a miss.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_size=1024, ttl=10, prefix=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        if self.prefix:
+            self.max_size = int(app.config.get(
+                f'{self.prefix}_MAX_SIZE', self.max_size))
+            self.ttl = float(app.config.get(f'{self.prefix}_TTL', self.ttl))
+        self.clear()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0 and self.ttl > 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, self._MISSING)
+            if item is not self._MISSING:
+                value, expires_at = item
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._store(key, value)
+
+    def add(self, key, value):
+        """Sets `key` unless it already holds an unexpired value, so a value
+        read before a concurrent `set` does not overwrite it."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            item = self._data.get(key, self._MISSING)
+            if item is not self._MISSING and item[1] > time.monotonic():
+                return False
+            self._store(key, value)
+            return True
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def _store(self, key, value):
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._data),
+                'maxSize': self.max_size,
+                'ttl': self.ttl
+            }
+
+    def __len__(self):
+        return len(self._data)
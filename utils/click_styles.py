@@ -27,6 +27,16 @@ class Dropped(AbstractStyle):
     color = 'yellow'
 
 
+class Migrated(AbstractStyle):
+    type_action = 'migrated'
+    color = 'green'
+
+
+class Reverted(AbstractStyle):
+    type_action = 'reverted'
+    color = 'yellow'
+
+
 class Aborted(AbstractStyle):
     type_action = 'aborted'
     color = 'red'
@@ -1,8 +1,13 @@
 import functools
+import hashlib
 import logging
+import os
 import sys
+import threading
+import time
 import traceback
 import json
+from collections import OrderedDict
 from .errors import (
     APIException,
     ApplicationException,
@@ -10,7 +15,8 @@ from .errors import (
     NotFoundError,
     NotAuthorizedError,
     ClientException,
-    ConflictError
+    ConflictError,
+    ServiceUnavailableError
 )
 from flask_jwt_extended.exceptions import (
     FreshTokenRequired,
@@ -19,38 +25,142 @@ from flask_jwt_extended.exceptions import (
     UserLoadError,
     JWTExtendedException  # GLOBAL EXCEPTION
 )
+from .instrumentation import get_query_stats
+from .tracing import span
 from werkzeug.exceptions import HTTPException
 from sqlalchemy.exc import IntegrityError
 
 
+class FormattedTraceback:
+    """Renders `exc_info` like `repr(traceback.format_exception(...))` only
+    when the record is written, on the logging thread."""
+
+    __slots__ = ('exc_info',)
+
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+    def __str__(self):
+        return repr(traceback.format_exception(*self.exc_info))
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ErrorAggregator:
+    """Groups unexpected exceptions by fingerprint.
+
+    The fingerprint is the exception type plus the innermost frame of our
+    own code that raised it. Only the first occurrence of a fingerprint in
+    each `ERROR_AGGREGATION_WINDOW` seconds is logged with its trace, the
+    others are counted; see `record` and `stats`.
+    """
+
+    def __init__(self, window=60, max_size=1000):
+        self.window = window
+        self.max_size = max_size
+        self._errors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.window = float(app.config.get(
+            'ERROR_AGGREGATION_WINDOW', self.window))
+        with self._lock:
+            self._errors.clear()
+
+    @staticmethod
+    def fingerprint(exc_info):
+        exc_type, exc_value, exc_traceback = exc_info
+        frames = traceback.extract_tb(exc_traceback)
+        own = [frame for frame in frames if frame.filename.startswith(ROOT)
+               and 'site-packages' not in frame.filename]
+        frame = (own or frames or [None])[-1]
+        where = f'{frame.filename}:{frame.lineno}:{frame.name}' if frame else ''
+        key = f'{exc_type.__module__}.{exc_type.__qualname__}@{where}'
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:12], key
+
+    def record(self, exc_info):
+        """
+        Counts one occurrence. Returns the fingerprint, the count in the
+        current window (1 means a trace should be logged) and the count of
+        the window that just ended, 0 when none did.
+        """
+        fingerprint, key = self.fingerprint(exc_info)
+        now = time.time()
+        with self._lock:
+            error = self._errors.get(fingerprint)
+            previous = 0
+            if error is None:
+                error = dict(fingerprint=fingerprint, error=key, total=0,
+                             count=0, window_start=now, first_seen=now)
+                self._errors[fingerprint] = error
+                if len(self._errors) > self.max_size:
+                    self._errors.popitem(last=False)
+            elif now - error['window_start'] >= self.window:
+                previous = error['count']
+                error['count'] = 0
+                error['window_start'] = now
+            self._errors.move_to_end(fingerprint)
+            error['count'] += 1
+            error['total'] += 1
+            error['last_seen'] = now
+            return fingerprint, error['count'], previous
+
+    def stats(self):
+        """Fingerprints seen, most recent first."""
+        with self._lock:
+            return [dict(error) for error in reversed(self._errors.values())]
+
+
+error_aggregator = ErrorAggregator()
+
+
 class ErrorHandler:
 
     def __init__(self, logger, blueprint):
         self._logger = logger
         self._blueprint = blueprint.name
 
+    def _log(self, loggin_type, message, *args):
+        # Arguments are only formatted when the record is written.
+        stats = get_query_stats()
+        if stats is not None:
+            message, args = message + ' %s', args + (stats.summary(),)
+        self._logger.log(loggin_type, message, *args,
+                         extra=dict(bp=self._blueprint))
+
+    def _log_expected(self, loggin_type, e):
+        # Client errors are part of the normal flow, no trace is formatted.
+        self._log(loggin_type, '%s: %s', type(e).__name__,
+                  getattr(e, 'user_err_msg', e))
+
     def _prepare_traceback_to_log(self, loggin_type):
-        exc_type, exc_value, exc_traceback = sys.exc_info()
-        trace = repr(traceback.format_exception(
-            exc_type, exc_value, exc_traceback))
-        self._logger.log(loggin_type, trace, extra=dict(bp=self._blueprint))
+        exc_info = sys.exc_info()
+        fingerprint, count, previous = error_aggregator.record(exc_info)
+        if previous > 1:
+            self._log(loggin_type, '[%s] %s occurrences in the last window',
+                      fingerprint, previous)
+        if count == 1:
+            self._log(loggin_type, '[%s] %s', fingerprint,
+                      FormattedTraceback(exc_info))
 
     def __call__(self, func, *args, **kwargs):
+        traced = span(f'{self._blueprint}.{func.__name__}')(func)
+
         @functools.wraps(func)
         def wrapper_decorator(*args, **kwargs):
             try:
-                result = func(*args, **kwargs)
-                self._logger.log(logging.INFO, result,
-                                 extra=dict(bp=self._blueprint))
+                result = traced(*args, **kwargs)
+                self._log(logging.INFO, '%s', result)
                 return result
-            except (ConflictError, NotAuthorizedError) as e:
-                self._prepare_traceback_to_log(logging.INFO)
+            except (ConflictError, NotAuthorizedError, ServiceUnavailableError) as e:
+                self._log_expected(logging.INFO, e)
                 return e.to_json(), e.http_status
             except (ClientException,) as e:
-                self._prepare_traceback_to_log(logging.ERROR)
+                self._log_expected(logging.ERROR, e)
                 return e.to_json(), e.http_status
             except (HTTPException,) as e:
-                self._prepare_traceback_to_log(logging.ERROR)
+                self._log_expected(logging.ERROR, e)
                 return ClientException(user_err_msg=str(e)).to_json(), e.code or e.http_status
             except (ApplicationException, JWTExtendedException) as e:
                 self._prepare_traceback_to_log(logging.ERROR)
@@ -62,9 +172,13 @@ class ErrorHandler:
 
 
 def error_raise_handler(func):
+    name = func.__qualname__
+
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
         try:
-            return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
         except IntegrityError as e:
             exc_type, exc_value, exc_traceback = sys.exc_info()
             raise DBException(user_err_msg=str(exc_value).split('\n')[0])
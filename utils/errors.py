@@ -1,9 +1,29 @@
 import json
-from flask import jsonify
+from functools import lru_cache
+from flask import jsonify, current_app
 from http import HTTPStatus
 from datetime import datetime
 
 
+@lru_cache(maxsize=1024)
+def _render_error(status, message, pretty):
+    return jsonify({'status': status, 'message': message}).get_data()
+
+
+def error_response(status, message):
+    """
+    JSON error response of `status` and `message`. Bodies of string messages
+    are rendered once and reused, only the response object is new.
+    """
+    if not isinstance(message, str):
+        return jsonify({'status': status, 'message': message})
+    pretty = current_app.config['JSONIFY_PRETTYPRINT_REGULAR'] or current_app.debug
+    return current_app.response_class(
+        _render_error(int(status), message, pretty),
+        mimetype=current_app.config['JSONIFY_MIMETYPE']
+    )
+
+
 class APIException(Exception):
     """Base API Exception"""
 
@@ -22,8 +42,7 @@ class APIException(Exception):
             self.user_err_msg = user_err_msg
 
     def to_json(self):
-        err_object = {'status': self.http_status, 'message': self.user_err_msg}
-        return jsonify(err_object)
+        return error_response(self.http_status, self.user_err_msg)
 
     def log_exception(self):
         exception = {
@@ -50,6 +69,22 @@ class DBException(ApplicationException):
     user_err_msg = 'Sorry. An unexpected error occurred on our end.'
 
 
+class ServiceUnavailableError(ApplicationException):
+    """The server is saturated, the client should retry after a while"""
+    http_status = HTTPStatus.SERVICE_UNAVAILABLE
+    internal_err_msg = 'Service saturated, request rejected.'
+    user_err_msg = 'The service is busy. Please try again later.'
+
+    def __init__(self, *args, user_err_msg=None, retry_after=1):
+        super().__init__(*args, user_err_msg=user_err_msg)
+        self.retry_after = retry_after
+
+    def to_json(self):
+        response = super().to_json()
+        response.headers['Retry-After'] = str(self.retry_after)
+        return response
+
+
 class TokenNotFound(DBException):
     """ Indicates that a token could not be found in the database
     """
@@ -65,6 +100,13 @@ class ClientException(APIException):
     user_err_msg = 'A bad request was received.'
 
 
+class InvalidCursorError(ClientException):
+    """The pagination cursor sent by the client cannot be decoded"""
+    http_status = HTTPStatus.BAD_REQUEST
+    internal_err_msg = 'Malformed pagination cursor'
+    user_err_msg = 'Invalid cursor.'
+
+
 class NotFoundError(ClientException):
     """Indicates resource was not found"""
     http_status = HTTPStatus.NOT_FOUND
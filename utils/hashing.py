@@ -0,0 +1,129 @@
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from flask_bcrypt import generate_password_hash, check_password_hash
+from utils.errors import ServiceUnavailableError
+from utils.tracing import span
+
+
+class PasswordHasher:
+    """Runs bcrypt hashing and verification on a bounded process pool.
+
+    At most `BCRYPT_POOL_SIZE` hashes run at once and `BCRYPT_QUEUE_DEPTH`
+    more may wait for a worker; past that `ServiceUnavailableError` is raised
+    right away instead of queueing the request. A pool size of 0 hashes on
+    the calling thread.
+    New hashes use the `BCRYPT_LOG_ROUNDS` cost, see `calibrate_log_rounds`.
+    Workers are started with `forkserver`, which imports the main script
+    again: a script creating the app must guard it with
+    `if __name__ == '__main__'`, as `command.py` does.
+    """
+
+    def __init__(self, app=None):
+        self.log_rounds = 10
+        self.pool_size = os.cpu_count() or 1
+        self.queue_depth = 32
+        self.retry_after = 1
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(
+            self.pool_size + self.queue_depth)
+        self._lock = threading.Lock()
+        atexit.register(self.shutdown)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.shutdown()
+        self.log_rounds = int(app.config.get(
+            'BCRYPT_LOG_ROUNDS', self.log_rounds))
+        self.pool_size = int(app.config.get('BCRYPT_POOL_SIZE', self.pool_size))
+        self.queue_depth = int(app.config.get(
+            'BCRYPT_QUEUE_DEPTH', self.queue_depth))
+        self.retry_after = int(app.config.get(
+            'BCRYPT_RETRY_AFTER', self.retry_after))
+        self._slots = threading.BoundedSemaphore(
+            max(self.pool_size, 1) + self.queue_depth)
+
+    def generate_password_hash(self, password, rounds=None) -> str:
+        return self._run(generate_password_hash, password,
+                         rounds or self.log_rounds).decode('utf-8')
+
+    def check_password_hash(self, pw_hash, password) -> bool:
+        return self._run(check_password_hash, pw_hash, password)
+
+    def needs_rehash(self, pw_hash) -> bool:
+        """True when `pw_hash` was not made with the configured cost."""
+        return get_log_rounds(pw_hash) != self.log_rounds
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # The app runs threads (log listener, writers, pruner), a
+                # plain fork could copy one of their locks held. Workers are
+                # forked from a clean forkserver process instead, where the
+                # platform has one.
+                methods = multiprocessing.get_all_start_methods()
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.pool_size,
+                    mp_context=multiprocessing.get_context(
+                        'forkserver' if 'forkserver' in methods else 'spawn')
+                )
+            return self._pool
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise ServiceUnavailableError(retry_after=self.retry_after)
+        try:
+            with span(f'bcrypt.{func.__name__}'):
+                if self.pool_size <= 0:
+                    return func(*args)
+                return self._executor().submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+
+def get_log_rounds(pw_hash) -> Optional[int]:
+    """Reads the cost of a `$2b$<cost>$...` bcrypt hash, None if malformed."""
+    try:
+        return int(pw_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def measure_log_rounds(rounds, samples=3) -> float:
+    """Median milliseconds taken by one bcrypt hash of cost `rounds`."""
+    timings = list()
+    for _ in range(samples):
+        start = time.perf_counter()
+        generate_password_hash('calibrate-bcrypt', rounds)
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+
+def calibrate_log_rounds(target_ms, min_rounds=10, max_rounds=16, samples=3):
+    """
+    Measures bcrypt on this host from `min_rounds` up and returns the highest
+    cost whose median hash time stays under `target_ms`, together with the
+    list of (rounds, milliseconds) measured. Returns `min_rounds` when even
+    that one is over the target. Each cost doubles the time, so the
+    measurement stops at the first cost over the target.
+    """
+    chosen = min_rounds
+    timings = list()
+    for rounds in range(min_rounds, max_rounds + 1):
+        elapsed = measure_log_rounds(rounds, samples)
+        timings.append((rounds, elapsed))
+        if elapsed > target_ms:
+            break
+        chosen = rounds
+    return chosen, timings
@@ -0,0 +1,106 @@
+import logging
+import re
+from collections import Counter
+from flask import g, request, has_request_context
+
+logger = logging.getLogger('app')
+
+_SPACES = re.compile(r'\s+')
+# `IN (?, ?, ?)` fingerprints like `IN (?)` whatever the number of values.
+_PARAMETER_LIST = re.compile(r'\(\s*(?:\?|%\(\w+\)s)(?:\s*,\s*(?:\?|%\(\w+\)s))*\s*\)')
+
+
+def fingerprint(statement: str) -> str:
+    return _PARAMETER_LIST.sub('(?)', _SPACES.sub(' ', statement).strip())
+
+
+class QueryStats:
+    """Queries run by the current request, see `SQLInstrumentation`."""
+
+    __slots__ = ('count', 'duration', 'statements')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.duration += elapsed
+        self.statements[fingerprint(statement)] += 1
+
+    def repeated(self, threshold):
+        """Statements run more than `threshold` times, most repeated first."""
+        if threshold <= 0:
+            return []
+        return [(statement, times)
+                for statement, times in self.statements.most_common()
+                if times > threshold]
+
+    def summary(self):
+        return f'db={self.count}q/{self.duration * 1000:.1f}ms'
+
+    def __repr__(self):
+        return f'<QueryStats {self.summary()}>'
+
+
+def record_query(statement, elapsed):
+    """Called by the engine hooks of `settings.database` after each query."""
+    if has_request_context():
+        stats = g.get('query_stats', None)
+        if stats is not None:
+            stats.record(statement, elapsed)
+
+
+def get_query_stats() -> QueryStats:
+    """`QueryStats` of the current request, None when not instrumented."""
+    if has_request_context():
+        return g.get('query_stats', None)
+    return None
+
+
+class SQLInstrumentation:
+    """Counts and times the queries of each request.
+
+    Adds `Server-Timing` and `X-DB-Queries` headers to the responses and
+    logs a warning for every statement run more than
+    `SQL_REPEAT_THRESHOLD` times in one request, the usual N+1 shape; such
+    responses also get the `X-DB-Repeated-Queries` header. Set
+    `SQL_INSTRUMENTATION` to False to turn it off.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.repeat_threshold = 10
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('SQL_INSTRUMENTATION', self.enabled))
+        self.repeat_threshold = int(app.config.get(
+            'SQL_REPEAT_THRESHOLD', self.repeat_threshold))
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    def before_request(self):
+        if self.enabled:
+            g.query_stats = QueryStats()
+
+    def after_request(self, response):
+        stats = g.pop('query_stats', None)
+        if stats is None:
+            return response
+        response.headers['X-DB-Queries'] = str(stats.count)
+        response.headers.add(
+            'Server-Timing', f'db;dur={stats.duration * 1000:.3f};desc="{stats.count} queries"')
+        repeated = stats.repeated(self.repeat_threshold)
+        if repeated:
+            response.headers['X-DB-Repeated-Queries'] = str(len(repeated))
+            for statement, times in repeated:
+                logger.log(logging.WARNING,
+                           f'{request.method} {request.path} ran {times} times: {statement}',
+                           extra=dict(bp=request.blueprint or 'sql'))
+        return response
+
+
+sql_instrumentation = SQLInstrumentation()
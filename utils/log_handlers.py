@@ -0,0 +1,138 @@
+import atexit
+import gzip
+import logging
+import os
+import queue
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    TimedRotatingFileHandler
+)
+
+
+# Rotated files are gzipped here, one at a time, so neither the request
+# threads nor the listener thread wait for the compression.
+_compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='log-compressor')
+
+
+def _gzip(source, dest):
+    with open(source, 'rb') as source_file, gzip.open(dest, 'wb') as dest_file:
+        shutil.copyfileobj(source_file, dest_file)
+    os.remove(source)
+
+
+class CompressionMixin:
+    """Names the rotated files `*.gz` and compresses them in the background."""
+
+    def __init__(self, *args, compress=True, **kwargs):
+        self._compressing = None
+        super().__init__(*args, **kwargs)
+        if compress:
+            self.namer = self._gz_namer
+            self.rotator = self._gz_rotator
+
+    def doRollover(self):
+        # The rollover shifts the `.N.gz` files before rotating, the
+        # previous compression must have written its file by then.
+        if self._compressing is not None:
+            self._compressing.result()
+            self._compressing = None
+        super().doRollover()
+
+    @staticmethod
+    def _gz_namer(name):
+        return name + '.gz'
+
+    def _gz_rotator(self, source, dest):
+        pending = dest[:-len('.gz')] + '.pending'
+        os.replace(source, pending)
+        try:
+            self._compressing = _compressor.submit(_gzip, pending, dest)
+        except RuntimeError:
+            # The executor is shut down at interpreter exit.
+            _gzip(pending, dest)
+
+
+class CompressedRotatingFileHandler(CompressionMixin, RotatingFileHandler):
+    pass
+
+
+class CompressedTimedRotatingFileHandler(CompressionMixin, TimedRotatingFileHandler):
+    pass
+
+
+class DroppingQueueHandler(QueueHandler):
+    """`QueueHandler` over a bounded queue that never blocks the caller.
+
+    Records are put without waiting; when the queue is full they are
+    dropped and counted in `dropped`. Records are formatted by the handlers
+    of the listener thread, not here.
+    """
+
+    def __init__(self, max_size=10000):
+        super().__init__(queue.Queue(max_size))
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record):
+        # Same process, the record does not need to be pickled.
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+
+_listeners = list()
+
+
+def start_queue_logging(logger_names, max_size=10000):
+    """
+    Moves the handlers of each logger of `logger_names` ('' is the root)
+    behind a `DroppingQueueHandler`: the logger only enqueues records and a
+    `QueueListener` thread writes them with the original handlers.
+    """
+    stop_queue_logging()
+    for name in logger_names:
+        logger = logging.getLogger(name or None)
+        handlers = list(logger.handlers)
+        if not handlers:
+            continue
+        queue_handler = DroppingQueueHandler(max_size)
+        queue_handler.setLevel(min(handler.level for handler in handlers))
+        listener = QueueListener(
+            queue_handler.queue, *handlers, respect_handler_level=True)
+        for handler in handlers:
+            logger.removeHandler(handler)
+        logger.addHandler(queue_handler)
+        listener.start()
+        _listeners.append((logger, queue_handler, listener, handlers))
+
+
+def stop_queue_logging():
+    """Writes the queued records and puts the original handlers back."""
+    while _listeners:
+        logger, queue_handler, listener, handlers = _listeners.pop()
+        listener.stop()
+        logger.removeHandler(queue_handler)
+        for handler in handlers:
+            logger.addHandler(handler)
+
+
+def logging_stats() -> dict:
+    """Queued and dropped records of each queued logger."""
+    return {
+        logger.name: dict(queued=queue_handler.queue.qsize(),
+                          dropped=queue_handler.dropped)
+        for logger, queue_handler, listener, handlers in _listeners
+    }
+
+
+atexit.register(stop_queue_logging)
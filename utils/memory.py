@@ -0,0 +1,155 @@
+import fnmatch
+import os
+import threading
+import tracemalloc
+from flask import g, request
+
+# Allocations of the tracer itself and of the import machinery are noise.
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+class EndpointMemory:
+    """Allocated bytes of the requests of one endpoint."""
+
+    __slots__ = ('endpoint', 'requests', 'net', 'peak', 'max_peak')
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.requests = 0
+        # Sums over the requests, net is what a request left allocated.
+        self.net = 0
+        self.peak = 0
+        self.max_peak = 0
+
+    def add(self, net, peak):
+        self.requests += 1
+        self.net += net
+        self.peak += peak
+        self.max_peak = max(self.max_peak, peak)
+
+    def summary(self) -> dict:
+        requests = self.requests or 1
+        return dict(endpoint=self.endpoint, requests=self.requests,
+                    net_bytes=self.net, avg_net_bytes=self.net // requests,
+                    avg_peak_bytes=self.peak // requests,
+                    max_peak_bytes=self.max_peak)
+
+
+class MemoryTracker:
+    """Allocations per request and per endpoint, with tracemalloc.
+
+    With `MEMORY_TRACKING` True every request records the bytes it left
+    allocated (net) and the peak above what was allocated when it started,
+    aggregated per endpoint. tracemalloc keeps `MEMORY_TRACKING_FRAMES`
+    frames per allocation and slows the process down noticeably, it is off
+    by default. The peak is process wide: requests served at the same time
+    share it, the numbers are exact on a single threaded server.
+
+    `snapshot()` compares the allocations with the previous snapshot and
+    returns the `MEMORY_TRACKING_TOP` sites that grew the most.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.frames = 10
+        self.top = 20
+        self._endpoints = dict()
+        self._snapshot = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('MEMORY_TRACKING', self.enabled))
+        self.frames = int(app.config.get('MEMORY_TRACKING_FRAMES', self.frames))
+        self.top = int(app.config.get('MEMORY_TRACKING_TOP', self.top))
+        app.before_request(self.before_request)
+        app.teardown_request(self.teardown_request)
+        if self.enabled:
+            self.start()
+
+    def start(self):
+        self.enabled = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def stop(self):
+        self.enabled = False
+        with self._lock:
+            self._snapshot = None
+        tracemalloc.stop()
+
+    def before_request(self):
+        if not self.enabled or not tracemalloc.is_tracing():
+            return
+        tracemalloc.reset_peak()
+        g.memory_tracking = (request.endpoint or 'unmatched',
+                             tracemalloc.get_traced_memory()[0])
+
+    def teardown_request(self, exception=None):
+        tracking = g.pop('memory_tracking', None)
+        if tracking is None or not tracemalloc.is_tracing():
+            return
+        endpoint, start = tracking
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            memory = self._endpoints.get(endpoint)
+            if memory is None:
+                memory = self._endpoints[endpoint] = EndpointMemory(endpoint)
+            memory.add(current - start, max(peak - start, 0))
+
+    def get(self, endpoint) -> EndpointMemory:
+        with self._lock:
+            return self._endpoints.get(endpoint)
+
+    def summary(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            endpoints = [memory.summary() for memory in self._endpoints.values()]
+        return dict(tracing=tracemalloc.is_tracing(), traced_bytes=current,
+                    peak_bytes=peak, endpoints=endpoints)
+
+    def snapshot(self, limit=None, key_type='lineno', pattern=None) -> list:
+        """
+        Takes a snapshot and returns the allocation sites that grew the
+        most since the previous one (since tracking started for the first
+        one). `pattern` keeps the sites of matching file names only, e.g.
+        '*/workforce/*'.
+        """
+        if not tracemalloc.is_tracing():
+            return list()
+        snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+        with self._lock:
+            previous, self._snapshot = self._snapshot, snapshot
+        if previous is None:
+            stats = snapshot.statistics(key_type)
+        else:
+            stats = snapshot.compare_to(previous, key_type)
+        sites = list()
+        for stat in stats:
+            frame = stat.traceback[0]
+            if pattern and not fnmatch.fnmatch(frame.filename, pattern):
+                continue
+            filename = os.path.relpath(frame.filename)
+            if filename.startswith('..'):
+                filename = frame.filename
+            sites.append(dict(
+                site=f'{filename}:{frame.lineno}',
+                size=stat.size, size_diff=getattr(stat, 'size_diff', stat.size),
+                count=stat.count, count_diff=getattr(stat, 'count_diff', stat.count)))
+            if len(sites) >= (limit or self.top):
+                break
+        return sites
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._snapshot = None
+
+
+memory_tracker = MemoryTracker()
@@ -0,0 +1,154 @@
+import threading
+import time
+from bisect import bisect_left
+from flask import g, request
+
+# Upper bounds in seconds of the latency histogram buckets, +Inf is implied.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class _Shard:
+    """Counters of one thread, only that thread writes them."""
+
+    __slots__ = ('latency', 'requests', 'in_flight')
+
+    def __init__(self):
+        # endpoint -> [bucket counts..., +Inf count, sum]
+        self.latency = dict()
+        # (endpoint, method, status) -> count
+        self.requests = dict()
+        # endpoint -> requests started minus finished
+        self.in_flight = dict()
+
+
+class Metrics:
+    """Per-endpoint latency histograms, in-flight gauges and status counters.
+
+    Every thread records into its own shard without taking a lock, shards
+    are merged when the metrics are scraped (`render`). The shards of
+    finished threads are folded into one, so a thread-per-request server
+    does not grow the list. `METRICS_ENABLED` turns the hooks off.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.enabled = True
+        self._local = threading.local()
+        self._shards = list()
+        self._retired = _Shard()
+        self._lock = threading.Lock()
+        self._collectors = list()
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('METRICS_ENABLED', self.enabled))
+        if self.enabled:
+            app.before_request(self.before_request)
+            app.after_request(self.after_request)
+            app.teardown_request(self.teardown_request)
+
+    def collector(self, func):
+        """Registers `func`, returning extra exposition lines, for `render`."""
+        self._collectors.append(func)
+        return func
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def before_request(self):
+        endpoint = request.endpoint or 'unmatched'
+        in_flight = self._shard().in_flight
+        in_flight[endpoint] = in_flight.get(endpoint, 0) + 1
+        g.metrics_request = (endpoint, time.perf_counter())
+
+    def after_request(self, response):
+        g.metrics_status = response.status_code
+        return response
+
+    def teardown_request(self, exception=None):
+        started = g.pop('metrics_request', None)
+        if started is None:
+            return
+        endpoint, start = started
+        status = g.pop('metrics_status', 500)
+        self.observe(endpoint, request.method, status,
+                     time.perf_counter() - start)
+
+    def observe(self, endpoint, method, status, elapsed):
+        shard = self._shard()
+        shard.in_flight[endpoint] = shard.in_flight.get(endpoint, 0) - 1
+        histogram = shard.latency.get(endpoint)
+        if histogram is None:
+            histogram = shard.latency[endpoint] = [0] * (len(self.buckets) + 2)
+        histogram[bisect_left(self.buckets, elapsed)] += 1
+        histogram[-1] += elapsed
+        key = (endpoint, method, status)
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+
+    def _merge(self, target, shard):
+        for endpoint, histogram in shard.latency.copy().items():
+            merged = target.latency.setdefault(endpoint, [0] * len(histogram))
+            for i, value in enumerate(list(histogram)):
+                merged[i] += value
+        for key, count in shard.requests.copy().items():
+            target.requests[key] = target.requests.get(key, 0) + count
+        for endpoint, count in shard.in_flight.copy().items():
+            target.in_flight[endpoint] = target.in_flight.get(endpoint, 0) + count
+
+    def snapshot(self) -> _Shard:
+        """Merges every shard into a new one."""
+        with self._lock:
+            alive = list()
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    self._merge(self._retired, shard)
+            self._shards = alive
+            total = _Shard()
+            self._merge(total, self._retired)
+            for thread, shard in alive:
+                self._merge(total, shard)
+        return total
+
+    def render(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        total = self.snapshot()
+        lines = [
+            '# HELP http_request_duration_seconds Request latency by endpoint.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        for endpoint, histogram in sorted(total.latency.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, histogram):
+                cumulative += count
+                lines.append(
+                    f'http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+            lines.append(
+                f'http_request_duration_seconds_sum{{endpoint="{endpoint}"}} {histogram[-1]:.6f}')
+            lines.append(
+                f'http_request_duration_seconds_count{{endpoint="{endpoint}"}} {cumulative}')
+        lines += [
+            '# HELP http_requests_total Finished requests by endpoint, method and status.',
+            '# TYPE http_requests_total counter',
+        ]
+        for (endpoint, method, status), count in sorted(total.requests.items()):
+            lines.append(
+                f'http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+        lines += [
+            '# HELP http_requests_in_flight Requests being served by endpoint.',
+            '# TYPE http_requests_in_flight gauge',
+        ]
+        for endpoint, count in sorted(total.in_flight.items()):
+            lines.append(f'http_requests_in_flight{{endpoint="{endpoint}"}} {count}')
+        for collect in self._collectors:
+            lines += collect()
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
@@ -0,0 +1,232 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+from collections import Counter
+from flask import g, request, url_for
+from flask_jwt_extended import verify_jwt_in_request_optional, get_jwt_claims
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}'
+
+
+class StackSampler:
+    """Samples the stacks of registered threads every `interval` seconds.
+
+    Sampling reads `sys._current_frames()` from its own daemon thread, the
+    sampled threads are never interrupted.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._threads = dict()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def add(self, thread_id, stacks: Counter):
+        with self._lock:
+            self._threads[thread_id] = stacks
+        if self._thread is None or not self._thread.is_alive():
+            self._start()
+        self._wakeup.set()
+
+    def remove(self, thread_id):
+        """Stops sampling `thread_id`. Its stacks are no longer written once
+        this returns: the lock is held for a whole sampling pass."""
+        with self._lock:
+            self._threads.pop(thread_id, None)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='stack-sampler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                sampled = bool(self._threads)
+                if sampled:
+                    self._sample()
+            if not sampled:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def _sample(self):
+        frames = sys._current_frames()
+        for thread_id, stacks in self._threads.items():
+            frame = frames.get(thread_id)
+            labels = list()
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                stacks[';'.join(reversed(labels))] += 1
+        del frames
+
+
+class EndpointProfile:
+    """cProfile statistics and sampled stacks aggregated for one endpoint."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.requests = 0
+        self.stats = None
+        self.stacks = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, profile: cProfile.Profile, stacks: Counter):
+        with self._lock:
+            self.requests += 1
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+            self.stacks.update(stacks)
+
+    def pstats(self) -> bytes:
+        """Marshalled statistics, the format of `pstats.Stats.dump_stats`."""
+        with self._lock:
+            return marshal.dumps(self.stats.stats if self.stats else {})
+
+    def collapsed(self) -> str:
+        """Sampled stacks as `frame;frame;frame count` lines, the input of
+        flamegraph.pl and speedscope."""
+        with self._lock:
+            return ''.join(f'{stack} {count}\n'
+                           for stack, count in sorted(self.stacks.items()))
+
+    def top(self, limit=20, sort='cumulative') -> str:
+        output = io.StringIO()
+        with self._lock:
+            if self.stats is not None:
+                stats = pstats.Stats(stream=output)
+                stats.add(self.stats).sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def summary(self) -> dict:
+        return dict(endpoint=self.endpoint, requests=self.requests,
+                    samples=sum(self.stacks.values()))
+
+
+class Profiler:
+    """Profiles a fraction of the requests, aggregated per endpoint.
+
+    `PROFILING_SAMPLE_RATE` of the requests (0 to 1), and every request of
+    a superuser carrying the `PROFILING_HEADER` header, run under cProfile
+    while a `StackSampler` records their stacks every `PROFILING_INTERVAL`
+    seconds. See `EndpointProfile` for the exported formats.
+    """
+
+    def __init__(self, app=None):
+        self.sample_rate = 0.0
+        self.header = 'X-Profile'
+        self.sampler = StackSampler()
+        self._profiles = dict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.sample_rate = float(app.config.get(
+            'PROFILING_SAMPLE_RATE', self.sample_rate))
+        self.header = app.config.get('PROFILING_HEADER', self.header)
+        self.sampler.interval = float(app.config.get(
+            'PROFILING_INTERVAL', self.sampler.interval))
+        app.before_request(self.before_request)
+        app.teardown_request(self.teardown_request)
+
+    def requested_by_admin(self) -> bool:
+        if not self.header or self.header not in request.headers:
+            return False
+        try:
+            verify_jwt_in_request_optional()
+            roles = get_jwt_claims().get('roles') or {}
+        except Exception:
+            return False
+        return isinstance(roles, dict) and bool(roles.get('is_superuser'))
+
+    def before_request(self):
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled and not self.requested_by_admin():
+            return
+        stacks = Counter()
+        profile = cProfile.Profile()
+        g.profiling = (request.endpoint or 'unmatched', profile, stacks)
+        self.sampler.add(threading.get_ident(), stacks)
+        profile.enable()
+
+    def teardown_request(self, exception=None):
+        profiling = g.pop('profiling', None)
+        if profiling is None:
+            return
+        endpoint, profile, stacks = profiling
+        profile.disable()
+        self.sampler.remove(threading.get_ident())
+        self.get(endpoint, create=True).add(profile, stacks)
+
+    def get(self, endpoint, create=False) -> EndpointProfile:
+        with self._lock:
+            if create and endpoint not in self._profiles:
+                self._profiles[endpoint] = EndpointProfile(endpoint)
+            return self._profiles.get(endpoint)
+
+    def summary(self) -> list:
+        with self._lock:
+            profiles = list(self._profiles.values())
+        return [profile.summary() for profile in profiles]
+
+    def reset(self, endpoint=None):
+        with self._lock:
+            if endpoint is None:
+                self._profiles.clear()
+            else:
+                self._profiles.pop(endpoint, None)
+
+
+profiler = Profiler()
+
+
+def call_endpoint(app, endpoint, requests=100, method=None, values=None,
+                  data=None, headers=None):
+    """
+    Calls `endpoint` `requests` times through the test client of `app`.
+    `values` fill the URL rule, `headers` must carry an admin token for
+    protected routes.
+    """
+    rules = [rule for rule in app.url_map.iter_rules()
+             if rule.endpoint == endpoint]
+    if not rules:
+        raise ValueError(f'Unknown endpoint {endpoint}.')
+    rule = rules[0]
+    method = method or sorted(rule.methods - {'HEAD', 'OPTIONS'})[0]
+    with app.test_request_context():
+        url = url_for(endpoint, **(values or {}))
+    client = app.test_client()
+    for _ in range(requests):
+        client.open(url, method=method, json=data, headers=headers)
+
+
+def profile_endpoint(app, endpoint, requests=100, method=None, values=None,
+                     data=None, headers=None) -> EndpointProfile:
+    """
+    Calls `endpoint` like `call_endpoint`, with the profiling header, and
+    returns its aggregated profile.
+    """
+    profiler.reset(endpoint)
+    call_endpoint(app, endpoint, requests=requests, method=method,
+                  values=values, data=data,
+                  headers=dict(headers or {}, **{profiler.header: '1'}))
+    return profiler.get(endpoint)
@@ -0,0 +1,125 @@
+import threading
+from marshmallow import fields
+from sqlalchemy import inspect
+from sqlalchemy.orm import Query
+from sqlalchemy.orm.interfaces import MANYTOONE
+from utils.serializer_compiler import compile_schema
+
+
+# Read-only projections: the columns a schema dumps are selected with Core
+# and mapped into small `__slots__` rows, no ORM instance is ever built.
+
+_projections = dict()
+_lock = threading.Lock()
+
+# SQLite accepts at most 999 bound parameters per statement.
+IN_CHUNK_SIZE = 500
+
+
+class NotProjectable(Exception):
+    """The schema dumps something that is not a plain column or a
+    many-to-one relationship, it needs the ORM instance."""
+
+
+class ProjectedRow:
+    __slots__ = ()
+
+    def __repr__(self):
+        values = ', '.join(f'{name}={getattr(self, name, None)!r}'
+                           for name in self.__slots__)
+        return f'<{type(self).__name__} {values}>'
+
+
+class Projection:
+
+    def __init__(self, model, schema, extra=()):
+        mapper = inspect(model)
+        self.model = model
+        self.columns = dict()
+        self.nested = list()
+        for attr_name, field in schema.dump_fields.items():
+            name = field.attribute or attr_name
+            if name in mapper.column_attrs:
+                self.columns[name] = getattr(model, name)
+            elif name in mapper.relationships:
+                self._add_relationship(mapper, name, field)
+            elif hasattr(model, name):
+                raise NotProjectable(f'{model.__name__}.{name}')
+        for name in extra:
+            self.columns.setdefault(name, getattr(model, name))
+        self.names = list(self.columns)
+        slots = tuple(self.names + [name for name, *_ in self.nested])
+        self.row_type = type(f'{model.__name__}Row',
+                             (ProjectedRow,), {'__slots__': slots})
+
+    def _add_relationship(self, mapper, name, field):
+        relationship = mapper.relationships[name]
+        if not isinstance(field, fields.Nested) \
+                or relationship.direction is not MANYTOONE \
+                or len(relationship.local_remote_pairs) != 1:
+            raise NotProjectable(f'{self.model.__name__}.{name}')
+        local, remote = relationship.local_remote_pairs[0]
+        local = mapper.get_property_by_column(local).key
+        remote = relationship.mapper.get_property_by_column(remote).key
+        target = Projection(relationship.mapper.class_,
+                            field.schema, extra=(remote,))
+        self.columns.setdefault(local, getattr(self.model, local))
+        self.nested.append((name, local, remote, target))
+
+    def make(self, values):
+        row = self.row_type.__new__(self.row_type)
+        for name, value in zip(self.names, values):
+            setattr(row, name, value)
+        return row
+
+    def fetch(self, queryset: Query) -> list:
+        """Runs `queryset`, filters and limits included, on the projected
+        columns only."""
+        statement = queryset.with_entities(*self.columns.values()).statement
+        result = queryset.session.execute(statement)
+        rows = [self.make(values) for values in result]
+        self._attach(queryset.session, rows)
+        return rows
+
+    def iterate(self, queryset: Query, chunk_size: int):
+        """Like `fetch`, reading and yielding `chunk_size` rows at a time."""
+        statement = queryset.with_entities(*self.columns.values()).statement
+        result = queryset.session.execute(statement)
+        while True:
+            chunk = [self.make(values) for values in result.fetchmany(chunk_size)]
+            if not chunk:
+                break
+            self._attach(queryset.session, chunk)
+            yield from chunk
+
+    def _attach(self, session, rows):
+        """Loads nested many-to-one rows with one IN query per chunk."""
+        for name, local, remote, target in self.nested:
+            keys = list({getattr(row, local) for row in rows} - {None})
+            related = dict()
+            remote_column = getattr(target.model, remote)
+            for i in range(0, len(keys), IN_CHUNK_SIZE):
+                queryset = session.query(target.model).filter(
+                    remote_column.in_(keys[i:i + IN_CHUNK_SIZE]))
+                for item in target.fetch(queryset):
+                    related[getattr(item, remote)] = item
+            for row in rows:
+                setattr(row, name, related.get(getattr(row, local)))
+
+
+def get_projection(model, schema, extra=()) -> Projection:
+    """
+    Returns the cached `Projection` of `model` for the fields dumped by
+    `schema`, plus the `extra` columns. None when the schema needs ORM
+    instances.
+    """
+    key = (model, schema, tuple(extra))
+    if key not in _projections:
+        with _lock:
+            if key not in _projections:
+                try:
+                    _projections[key] = Projection(
+                        model, compile_schema(schema).schema, extra)
+                except NotProjectable:
+                    _projections[key] = None
+    return _projections[key]
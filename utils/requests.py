@@ -72,12 +72,28 @@ def get_url_params(request, *args, **kwargs):
         type=to_bool
     )
 
+    # Whole result as a streamed response, see GenericListResponse.stream
+    stream = request.args.get(
+        'stream',
+        default=False,
+        type=to_bool
+    )
+
+    # Opaque keyset cursor, see GenericListResponse.lists
+    cursor = request.args.get(
+        'cursor',
+        default=None,
+        type=str
+    )
+
     for k in kwargs.keys():
         filters[str(k)] = kwargs[k]
 
     filters['page_size'] = page_size
     filters['page'] = page
     filters['deleted'] = deleted
+    filters['cursor'] = cursor
+    filters['stream'] = stream
     filters['to'] = date_to
     filters['from'] = date_from
 
@@ -1,13 +1,24 @@
 from http import HTTPStatus
+from flask import Response, stream_with_context, current_app, has_app_context
 from marshmallow import ValidationError
-from utils.errors import ConflictError, NotFoundError, DBException, ClientException
+from utils.errors import ConflictError, NotFoundError, DBException, ClientException, InvalidCursorError
 from utils.decorators import error_raise_handler
 from utils.serializers import ResponseSchema
+from utils.serializer_compiler import compile_schema
+from utils.projections import get_projection
+from settings.database import replica_reads, database_writer
+from utils.tracing import span
+from sqlalchemy import func, and_, or_
+from sqlalchemy.orm import Query, raiseload
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.exc import IntegrityError
 from marshmallow import Schema, fields
 from typing import List, Dict, Tuple, Type
 import marshmallow
+import base64
+import binascii
+import datetime
+import json
 
 
 class AbstractValidation:
@@ -25,6 +36,24 @@ class AbstractValidation:
         pass
 
 
+class EagerLoading:
+    model = None
+    # Loader options of the relationships the schema dumps, e.g.
+    # (joinedload(Seller.user),) or (selectinload(User.seller),).
+    eager_loading = ()
+
+    def get_query(self, read_only: bool = False) -> Query:
+        """
+        Base query of `model` with `eager_loading` applied. For `read_only`
+        queries in debug mode every other relationship is set to raise, so
+        a lazy load fired while serializing (an N+1) fails loudly.
+        """
+        query = self.model.query.options(*self.eager_loading)
+        if read_only and has_app_context() and current_app.debug:
+            query = query.options(raiseload('*'))
+        return query
+
+
 class AbstractResponse:
     model = None
     schema = None
@@ -32,63 +61,235 @@ class AbstractResponse:
     def __init__(self, request):
         self.data = request.get_json()
 
-    def set_response(self, status: int, total_results: int, serializer: Dict) -> Tuple[Dict, int]:
+    def set_response(self, status: int, total_results: int, serializer: Dict, offset: int = None, next_cursor: str = None) -> Tuple[Dict, int]:
         response = dict()
         response['status'] = status
         response['totalResults'] = total_results
+        if offset is not None:
+            response['offset'] = offset
+        if next_cursor is not None:
+            response['nextCursor'] = next_cursor
         response['results'] = serializer
 
-        response_serializer = ResponseSchema().dump(response)
+        response_serializer = compile_schema(ResponseSchema).dump(response)
 
         return response_serializer, status
 
 
-class GenericRetriveResponse:
+class GenericRetriveResponse(EagerLoading):
     model = None
     schema = None
+    # Read through a Core projection instead of ORM instances when possible.
+    use_projection = True
 
     @error_raise_handler
-    def get_object(self, id: int) -> Type[model]:
+    def get_object(self, id: int, read_only: bool = True) -> Type[model]:
+        """
+        Instance `id` of `model`. Pass `read_only=False` to modify it, see
+        `EagerLoading.get_query`.
+        """
         try:
-            instance = self.model.query.filter_by(id=id).one()
+            instance = self.get_query(read_only=read_only).filter_by(id=id).one()
             return instance
         except NoResultFound:
             raise ConflictError(
                 user_err_msg=f'{self.model.__name__}({id}) does not exists.')
 
     @error_raise_handler
+    def get_row(self, id: int):
+        """Read-only version of `get_object`, see `utils.projections`."""
+        projection = get_projection(self.model, self.schema) \
+            if self.use_projection else None
+        if projection is None:
+            return self.get_object(id)
+        rows = projection.fetch(self.model.query.filter_by(id=id))
+        if not rows:
+            raise ConflictError(
+                user_err_msg=f'{self.model.__name__}({id}) does not exists.')
+        return rows[0]
+
+    @error_raise_handler
+    @replica_reads()
     def retrive(self, id: int) -> Tuple[Dict, int]:
-        resultset = self.get_object(id)
-        serializer = self.schema().dump(resultset)
+        resultset = self.get_row(id)
+        with span('serialize'):
+            serializer = compile_schema(self.schema).dump(resultset)
         return serializer, HTTPStatus.OK
 
 
-class GenericListResponse(AbstractResponse):
+class GenericListResponse(EagerLoading, AbstractResponse):
     model = None
     schema = None
     queryset = None
     session = None
+    # Unique ordering used by the cursor mode, e.g. ('created', 'id').
+    cursor_fields = ('id',)
+    # Rows fetched and serialized at a time by the streaming mode.
+    stream_chunk_size = 1000
+    # Read through a Core projection instead of ORM instances when possible.
+    use_projection = True
 
     @error_raise_handler
-    def get_queryset(self, *args, **kwargs) -> Tuple[List[Type[model]], int]:
-        if self.queryset:
-            response = self.queryset
-            return response, len(response)
+    def get_queryset(self, *args, **kwargs) -> Query:
+        if self.queryset is not None:
+            return self.queryset
         if self.model:
-            response = self.model.query.filter_by(**kwargs).all()
-            return response, len(response)
+            return self.get_query(read_only=True).filter_by(
+                **kwargs).order_by(self.model.id)
         raise DBException(
             user_err_msg='QuerySet empty and model class not provided.')
 
     @error_raise_handler
-    def lists(self, *args, **kwargs) -> Tuple[Dict, int]:
-        queryset, total_results = self.get_queryset(**kwargs)
-        return self._list_serialize(queryset, total_results)
+    def paginate(self, queryset: Query, page: int, page_size: int) -> Tuple[List[Type[model]], int, int]:
+        """
+        Returns the rows of `page` (starting at 1), the total number of rows
+        and the offset of the page. LIMIT/OFFSET and COUNT run in the database.
+        """
+        offset = (max(page, 1) - 1) * page_size
+        if not isinstance(queryset, Query):
+            return queryset[offset:offset + page_size], len(queryset), offset
+        total_results = self.count(queryset)
+        resultset = self.fetch(queryset.limit(page_size).offset(offset))
+        return resultset, total_results, offset
+
+    def get_projection(self):
+        if not self.use_projection or self.model is None:
+            return None
+        return get_projection(self.model, self.schema, extra=self.cursor_fields)
+
+    def fetch(self, queryset: Query) -> List:
+        """
+        Runs `queryset`. Rows are read-only projections of the columns the
+        schema dumps, or ORM instances when the schema needs them.
+        """
+        projection = self.get_projection()
+        if projection is None:
+            return queryset.all()
+        return projection.fetch(queryset)
+
+    def count(self, queryset: Query) -> int:
+        if not isinstance(queryset, Query):
+            return len(queryset)
+        return queryset.order_by(None).with_entities(
+            func.count(self.model.id)).scalar()
+
+    @error_raise_handler
+    def stream(self, queryset: Query) -> Tuple[Response, int]:
+        """
+        Streams every row of `queryset` as a chunked JSON response with the
+        same envelope as `set_response`. Rows are fetched `stream_chunk_size`
+        at a time and the session is emptied after each chunk, so memory
+        does not grow with the number of rows.
+        """
+        total_results = self.count(queryset)
+        schema = compile_schema(self.schema)
+        projection = self.get_projection() \
+            if isinstance(queryset, Query) else None
+
+        def rows():
+            with replica_reads():
+                if projection is not None:
+                    yield from projection.iterate(queryset, self.stream_chunk_size)
+                elif isinstance(queryset, Query):
+                    yield from queryset.yield_per(self.stream_chunk_size)
+                else:
+                    yield from queryset
+
+        # Every row is sent, from the first one: offset 0, like page 1.
+        envelope, status = self.set_response(
+            HTTPStatus.OK, total_results, [], offset=0)
+        envelope.pop('results', None)
+
+        def generate():
+            header = json.dumps(envelope)
+            yield header[:-1] + ', "results": ['
+            for i, instance in enumerate(rows(), 1):
+                yield (', ' if i > 1 else '') + json.dumps(schema.dump(instance))
+                if i % self.stream_chunk_size == 0 and projection is None \
+                        and isinstance(queryset, Query):
+                    queryset.session.expunge_all()
+            yield ']}'
+
+        response = Response(
+            stream_with_context(generate()), mimetype='application/json')
+        return response, status
+
+    def encode_cursor(self, instance: Type[model]) -> str:
+        values = list()
+        for field in self.cursor_fields:
+            value = getattr(instance, field)
+            if isinstance(value, datetime.datetime):
+                value = value.isoformat()
+            values.append(value)
+        cursor = json.dumps(values, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(cursor).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, cursor: str) -> List:
+        try:
+            cursor += '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(cursor))
+            if not isinstance(values, list) or len(values) != len(self.cursor_fields):
+                raise ValueError(cursor)
+            for i, field in enumerate(self.cursor_fields):
+                column = getattr(self.model, field)
+                if column.type.python_type is datetime.datetime:
+                    values[i] = datetime.datetime.fromisoformat(values[i])
+            return values
+        except (binascii.Error, ValueError, TypeError):
+            raise InvalidCursorError()
+
+    @error_raise_handler
+    def seek(self, queryset: Query, cursor: str, page_size: int) -> Tuple[List[Type[model]], str]:
+        """
+        Returns the `page_size` rows that follow `cursor` in `cursor_fields`
+        order and the cursor of the next page, None on the last one. Each page
+        is a range scan, its cost does not grow with the depth.
+        """
+        if page_size < 1:
+            # An empty page has no last row to continue from. Offset pages
+            # still take a size of 0 to only read the total.
+            raise ConflictError(user_err_msg='Inferior Boundary Exceeded.')
+        columns = [getattr(self.model, field) for field in self.cursor_fields]
+        queryset = queryset.order_by(None).order_by(*columns)
+        if cursor:
+            values = self.decode_cursor(cursor)
+            # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y)
+            queryset = queryset.filter(or_(*[
+                and_(*[columns[j] == values[j] for j in range(i)],
+                     columns[i] > values[i])
+                for i in range(len(columns))
+            ]))
+        resultset = self.fetch(queryset.limit(page_size + 1))
+        next_cursor = None
+        if len(resultset) > page_size:
+            resultset = resultset[:page_size]
+            next_cursor = self.encode_cursor(resultset[-1])
+        return resultset, next_cursor
+
+    @error_raise_handler
+    @replica_reads()
+    def lists(self, *args, page: int = 1, page_size: int = 10, cursor: str = None, stream: bool = False, **kwargs) -> Tuple[Dict, int]:
+        """
+        Lists a page of `page`/`page_size`. When `cursor` is given, even
+        empty for the first page, the keyset mode is used instead: the
+        response carries `nextCursor` until the last page and no total.
+        With `stream` every row is sent in a streamed response, for exports.
+        """
+        queryset = self.get_queryset(**kwargs)
+        if stream:
+            return self.stream(queryset)
+        if cursor is not None:
+            resultset, next_cursor = self.seek(queryset, cursor, page_size)
+            return self._list_serialize(resultset, None, next_cursor=next_cursor)
+        resultset, total_results, offset = self.paginate(
+            queryset, page, page_size)
+        return self._list_serialize(resultset, total_results, offset)
 
     @error_raise_handler
-    def _list_serialize(self, queryset: List[Type[model]], total_results: int) -> Tuple[Dict, int]:
-        serializer = self.schema().dump(queryset, many=True)
-        return self.set_response(HTTPStatus.OK, total_results, serializer)
+    def _list_serialize(self, queryset: List[Type[model]], total_results: int, offset: int = None, next_cursor: str = None) -> Tuple[Dict, int]:
+        with span('serialize'):
+            serializer = compile_schema(self.schema).dump(queryset, many=True)
+        return self.set_response(HTTPStatus.OK, total_results, serializer, offset, next_cursor)
 
 
 class GenericCreateResponse(AbstractValidation):
@@ -107,7 +308,8 @@ class GenericCreateResponse(AbstractValidation):
 
             serializer = self.schema().load(self.data)
 
-            self.pre_validation(*args, **kwargs)
+            with span(f'{type(self).__name__}.pre_validation'):
+                self.pre_validation(*args, **kwargs)
 
             return serializer
         except ValidationError as e:
@@ -122,7 +324,8 @@ class GenericCreateResponse(AbstractValidation):
 
         instance = self.create_instance()
 
-        self.validation(*args, **kwargs)
+        with span(f'{type(self).__name__}.validation'):
+            self.validation(*args, **kwargs)
 
         deserializer = self.post_create(instance)
 
@@ -134,15 +337,16 @@ class GenericCreateResponse(AbstractValidation):
 
     @error_raise_handler
     def post_create(self, instance: Type[model]) -> Dict:
-        self.session.add(instance)
-        self.session.commit()
+        instance, = database_writer.save(instance, session=self.session)
 
-        self.post_validation()
+        with span(f'{type(self).__name__}.post_validation'):
+            self.post_validation()
 
-        return self.schema().dump(instance)
+        with span('serialize'):
+            return compile_schema(self.schema).dump(instance)
 
 
-class GenericDeleteResponse(AbstractValidation):
+class GenericDeleteResponse(EagerLoading, AbstractValidation):
     model = None
     schema = None
     session = None
@@ -150,7 +354,7 @@ class GenericDeleteResponse(AbstractValidation):
     @error_raise_handler
     def get_object(self, id: int) -> Type[model]:
         try:
-            instance = self.model.query.filter_by(id=id).one()
+            instance = self.get_query().filter_by(id=id).one()
             return instance
         except NoResultFound:
             raise ConflictError(
@@ -161,14 +365,15 @@ class GenericDeleteResponse(AbstractValidation):
         self.id = id
         instance = self.get_object(id)
         instance.deleted = True
-        self.session.commit()
+        instance, = database_writer.save(instance, session=self.session)
 
-        deserializer = self.schema().dump(instance)
+        with span('serialize'):
+            deserializer = compile_schema(self.schema).dump(instance)
 
         return deserializer, HTTPStatus.OK
 
 
-class GenericUpdateResponse(AbstractValidation):
+class GenericUpdateResponse(EagerLoading, AbstractValidation):
     model = None
     schema = None
     session = None
@@ -183,7 +388,7 @@ class GenericUpdateResponse(AbstractValidation):
     @error_raise_handler
     def get_object(self, id: int) -> Type[model]:
         try:
-            instance = self.model.query.filter_by(id=id).one()
+            instance = self.get_query().filter_by(id=id).one()
             return instance
         except NoResultFound:
             raise ConflictError(
@@ -205,7 +410,8 @@ class GenericUpdateResponse(AbstractValidation):
                     raise ClientException(
                         user_err_msg=f'The key({prop}) is empty or null.')
 
-            self.pre_validation(*args, **kwargs)
+            with span(f'{type(self).__name__}.pre_validation'):
+                self.pre_validation(*args, **kwargs)
         except ValidationError as e:
             raise NotFoundError(user_err_msg=e.messages)
         except Exception as e:
@@ -225,7 +431,8 @@ class GenericUpdateResponse(AbstractValidation):
                 continue
 
         self.update(instance, *args, **kwargs)
-        self.validation(*args, **kwargs)
+        with span(f'{type(self).__name__}.validation'):
+            self.validation(*args, **kwargs)
 
         deserializer = self.post_update(instance)
 
@@ -233,9 +440,10 @@ class GenericUpdateResponse(AbstractValidation):
 
     @error_raise_handler
     def post_update(self, instance: Type[model]) -> Dict:
-        self.session.commit()
-        deserializer = self.schema().dump(instance)
+        instance, = database_writer.save(instance, session=self.session)
 
-        self.post_validation()
+        with span(f'{type(self).__name__}.post_validation'):
+            self.post_validation()
 
-        return self.schema().dump(instance)
+        with span('serialize'):
+            return compile_schema(self.schema).dump(instance)
@@ -0,0 +1,68 @@
+import logging
+import threading
+
+logger = logging.getLogger('app')
+
+
+class PeriodicTask:
+    """Runs `func` every `<PREFIX>_INTERVAL` seconds on a daemon thread.
+
+    The remaining keyword arguments are defaults for `func`, each one can be
+    overridden by the `<PREFIX>_<NAME>` setting. An interval of 0 keeps the
+    task stopped. `check`, called with the configured options in `init_app`,
+    raises on invalid settings so they fail at startup.
+    """
+
+    def __init__(self, func, prefix, teardown=None, check=None, **options):
+        self.func = func
+        self.prefix = prefix
+        self.teardown = teardown
+        self.check = check
+        self.options = options
+        self.interval = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        self.interval = float(app.config.get(f'{self.prefix}_INTERVAL') or 0)
+        for name, default in self.options.items():
+            self.options[name] = type(default)(app.config.get(
+                f'{self.prefix}_{name.upper()}', default))
+        if self.check:
+            self.check(**self.options)
+        if self.interval > 0:
+            self.start()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=self.prefix.lower(), daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self.running:
+            self._thread.join(timeout)
+
+    def run_once(self):
+        try:
+            return self.func(**self.options)
+        finally:
+            if self.teardown:
+                self.teardown()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                result = self.run_once()
+                logger.log(logging.INFO, f'{self.prefix}: {result}',
+                           extra=dict(bp='scheduler'))
+            except Exception as e:
+                logger.log(logging.ERROR, f'{self.prefix}: {e!r}',
+                           extra=dict(bp='scheduler'))
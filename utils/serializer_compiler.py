@@ -0,0 +1,150 @@
+import datetime
+import threading
+from marshmallow import Schema, fields, missing
+from marshmallow.utils import get_value, ensure_text_type
+from marshmallow.decorators import PRE_DUMP, POST_DUMP
+
+
+# Compiled dump functions, built once per schema class and options.
+
+_compiled = dict()
+_lock = threading.RLock()
+
+
+class CompiledSchema:
+    """Drop-in replacement of `Schema.dump` for hot schemas.
+
+    The fields of the schema are turned into one generated function that
+    reads the attributes of the object directly, instead of walking the
+    fields generically on every call. Output is the same as `Schema.dump`.
+    Schemas with dump hooks or a custom `get_attribute` are dumped by
+    marshmallow unchanged.
+    """
+
+    def __init__(self, schema: Schema):
+        self.schema = schema
+        self.many = schema.many
+        self._dump_one = None
+
+    def dump(self, obj, *, many: bool = None):
+        many = self.many if many is None else bool(many)
+        if many and obj is not None:
+            dump_one = self._dump_one
+            return [dump_one(item) for item in obj]
+        return self._dump_one(obj)
+
+    def __repr__(self):
+        return f'<CompiledSchema {type(self.schema).__name__}>'
+
+
+def compile_schema(schema, **kwargs) -> CompiledSchema:
+    """
+    Returns the cached `CompiledSchema` of `schema`, a `Schema` class
+    (instantiated with `kwargs`) or instance.
+    """
+    if isinstance(schema, type):
+        key = (schema, _freeze(kwargs))
+        compiled = _compiled.get(key)
+        if compiled is not None:
+            return compiled
+        schema = schema(**kwargs)
+    else:
+        key = _schema_key(schema)
+        compiled = _compiled.get(key)
+        if compiled is not None:
+            return compiled
+    with _lock:
+        compiled = _compiled.get(key)
+        if compiled is None:
+            compiled = CompiledSchema(schema)
+            # Registered before building so recursive schemas find it.
+            _compiled[key] = compiled
+            _compiled.setdefault(_schema_key(schema), compiled)
+            compiled._dump_one = _build(schema)
+        return compiled
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(sorted(_freeze(v) for v in value))
+    return value
+
+
+def _schema_key(schema: Schema):
+    return (
+        type(schema),
+        _freeze(dict(
+            only=schema.only,
+            exclude=schema.exclude,
+            many=schema.many
+        ))
+    )
+
+
+def _build(schema: Schema):
+    if schema._has_processors(PRE_DUMP) or schema._has_processors(POST_DUMP) \
+            or type(schema).get_attribute is not Schema.get_attribute:
+        return schema.dump
+
+    namespace = dict(
+        _missing=missing,
+        _getattr=getattr,
+        _get_value=get_value,
+        _ensure_text_type=ensure_text_type,
+        _datetime=datetime.datetime,
+        _accessor=schema.get_attribute,
+    )
+    lines = [
+        'def dump_one(obj):',
+        '    get = _get_value if hasattr(obj, "__getitem__") else _getattr',
+        '    out = {}',
+    ]
+    for i, (attr_name, field) in enumerate(schema.dump_fields.items()):
+        key = field.data_key if field.data_key is not None else attr_name
+        attribute = field.attribute or attr_name
+        namespace[f'_field_{i}'] = field
+        if '.' in attribute or not field._CHECK_ATTRIBUTE:
+            lines += [
+                f'    v = _field_{i}.serialize({attr_name!r}, obj, accessor=_accessor)',
+                '    if v is not _missing:',
+                f'        out[{key!r}] = v',
+            ]
+            continue
+        lines.append(f'    v = get(obj, {attribute!r}, _missing)')
+        if field.default is not missing:
+            namespace[f'_default_{i}'] = field.default
+            call = '()' if callable(field.default) else ''
+            lines += [
+                '    if v is _missing:',
+                f'        v = _default_{i}{call}',
+            ]
+        lines += [
+            '    if v is not _missing:',
+            f'        out[{key!r}] = {_expression(field, i, namespace, attr_name)}',
+        ]
+    lines.append('    return out')
+    exec('\n'.join(lines), namespace)
+    return namespace['dump_one']
+
+
+def _expression(field, i, namespace, attr_name):
+    """Python expression serializing `v` like `field._serialize` does."""
+    fallback = f'_field_{i}._serialize(v, {attr_name!r}, obj)'
+    kind = type(field)
+    if kind is fields.Integer and not field.as_string:
+        return 'None if v is None else int(v)'
+    if kind in (fields.String, fields.Str):
+        return 'v if v is None or type(v) is str else _ensure_text_type(v)'
+    if kind in (fields.Boolean, fields.Bool):
+        return f'v if v is None or v is True or v is False else {fallback}'
+    if kind is fields.DateTime and field.format in (None, 'iso'):
+        return f'None if v is None else v.isoformat() if type(v) is _datetime else {fallback}'
+    if kind is fields.Dict and not field.key_field and not field.value_field:
+        return 'v'
+    if kind is fields.Nested and isinstance(field.schema, Schema):
+        namespace[f'_nested_{i}'] = compile_schema(field.schema)
+        many = 'True' if field.many else 'None'
+        return f'None if v is None else _nested_{i}.dump(v, many={many})'
+    return fallback
@@ -8,6 +8,7 @@ class ResponseSchema(Schema):
     status = fields.Int(dump_only=True)
     offset = fields.Int(dump_only=True)
     totalResults = fields.Int(dump_only=True)
+    nextCursor = fields.Str(dump_only=True)
     results = fields.Dict(dump_only=True)
 
 
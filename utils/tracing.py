@@ -0,0 +1,157 @@
+import functools
+import logging
+import random
+import re
+import time
+import uuid
+from flask import g, request, has_request_context
+
+logger = logging.getLogger('app')
+
+# Client request ids are echoed in responses and logs, anything else is
+# replaced by a new one.
+REQUEST_ID = re.compile(r'[A-Za-z0-9._:-]{1,128}')
+
+
+class Span:
+    __slots__ = ('name', 'start', 'end', 'children')
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end = None
+        self.children = list()
+
+    @property
+    def duration(self):
+        return (self.end or time.perf_counter()) - self.start
+
+    def __repr__(self):
+        return f'<Span {self.name} {self.duration * 1000:.1f}ms>'
+
+
+class Trace:
+    """Spans of one request, opened and closed on the request thread."""
+
+    __slots__ = ('request_id', 'root', 'stack')
+
+    def __init__(self, request_id, name):
+        self.request_id = request_id
+        self.root = Span(name)
+        self.stack = [self.root]
+
+    def open(self, name):
+        span = Span(name)
+        self.stack[-1].children.append(span)
+        self.stack.append(span)
+        return span
+
+    def close(self, span):
+        span.end = time.perf_counter()
+        # Spans left open by an exception are closed with their parent.
+        while len(self.stack) > 1 and self.stack.pop() is not span:
+            pass
+
+    def __str__(self):
+        return self.render()
+
+    def render(self) -> str:
+        lines = [f'request {self.request_id}']
+
+        def walk(span, depth):
+            lines.append(f'{"  " * depth}{span.name} {span.duration * 1000:.1f}ms')
+            for child in span.children:
+                walk(child, depth + 1)
+        walk(self.root, 1)
+        return '\n'.join(lines)
+
+
+def current_trace() -> Trace:
+    """Trace of the current request, None when it is not sampled."""
+    if has_request_context():
+        return g.get('trace', None)
+    return None
+
+
+class span:
+    """
+    Times the block (or the decorated function) as a child of the current
+    span. Does nothing when the request is not traced.
+    """
+
+    __slots__ = ('name', '_trace', '_span')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._trace = current_trace()
+        if self._trace is not None:
+            self._span = self._trace.open(self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._trace is not None:
+            self._trace.close(self._span)
+        return False
+
+    def __call__(self, func):
+        name = self.name
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+class Tracer:
+    """Request ids and span trees.
+
+    Every response carries an `X-Request-ID`, taken from the request when
+    the client sent a valid one, see `REQUEST_ID`. `TRACING_SAMPLE_RATE` of
+    the requests (0 to 1) are traced; a traced request slower than
+    `TRACING_SLOW_THRESHOLD` seconds is logged with its span tree.
+    """
+
+    def __init__(self, app=None):
+        self.sample_rate = 0.1
+        self.slow_threshold = 0.5
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.sample_rate = float(app.config.get(
+            'TRACING_SAMPLE_RATE', self.sample_rate))
+        self.slow_threshold = float(app.config.get(
+            'TRACING_SLOW_THRESHOLD', self.slow_threshold))
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown_request)
+
+    def before_request(self):
+        request_id = request.headers.get('X-Request-ID', '')
+        if not REQUEST_ID.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+        g.request_id = request_id
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            g.trace = Trace(g.request_id, f'{request.method} {request.path}')
+
+    def after_request(self, response):
+        # Not set when an earlier before_request handler answered.
+        request_id = g.get('request_id')
+        if request_id is not None:
+            response.headers['X-Request-ID'] = request_id
+        return response
+
+    def teardown_request(self, exception=None):
+        trace = g.pop('trace', None)
+        if trace is None:
+            return
+        trace.close(trace.root)
+        if trace.root.duration >= self.slow_threshold:
+            logger.log(logging.WARNING, 'slow %s', trace,
+                       extra=dict(bp=request.blueprint or 'tracing'))
+
+
+tracer = Tracer()
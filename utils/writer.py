@@ -0,0 +1,178 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from utils.errors import ServiceUnavailableError
+
+logger = logging.getLogger('app')
+
+
+class SingleWriter:
+    """Runs the write units of work of every thread on one writer thread.
+
+    `submit(unit)` queues `unit(session)` and returns a `Future` of its
+    result. A daemon thread takes up to `<PREFIX>_MAX_BATCH` queued units,
+    waiting at most `<PREFIX>_MAX_DELAY` seconds for them, runs each one in
+    its own SAVEPOINT and commits them all in one transaction (group
+    commit): SQLite sees a single writer and one sync per batch. A failing
+    unit only rolls back its savepoint and gets the exception; a failing
+    commit fails the whole batch.
+    `run(unit)` waits at most `<PREFIX>_TIMEOUT` seconds for the result and
+    raises `ServiceUnavailableError` past it; the unit may still commit later.
+    With `<PREFIX>_ENABLED` False, the default, units run right away on
+    the caller's `session`, like a plain commit.
+    """
+
+    def __init__(self, session, bind, prefix, max_batch=50, max_delay=0.002,
+                 timeout=30):
+        self.session = session
+        self.bind = bind
+        self.prefix = prefix
+        self.enabled = False
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        atexit.register(self.close)
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get(
+            f'{self.prefix}_ENABLED', self.enabled))
+        self.max_batch = int(app.config.get(
+            f'{self.prefix}_MAX_BATCH', self.max_batch))
+        self.max_delay = float(app.config.get(
+            f'{self.prefix}_MAX_DELAY', self.max_delay))
+        self.timeout = float(app.config.get(
+            f'{self.prefix}_TIMEOUT', self.timeout))
+
+    def submit(self, unit, *args) -> Future:
+        future = Future()
+        if not self.enabled:
+            try:
+                result = unit(self.session(), *args)
+                self.session.commit()
+                future.set_result(result)
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        _mark_written(self.session())
+        with self._cond:
+            self._queue.append((future, unit, args))
+            self._cond.notify()
+        if self._thread is None or not self._thread.is_alive():
+            self._start()
+        return future
+
+    def run(self, unit, *args):
+        """`submit(unit, *args)` and wait for its result."""
+        try:
+            return self.submit(unit, *args).result(timeout=self.timeout)
+        except TimeoutError:
+            raise ServiceUnavailableError(
+                f'{self.prefix}: no commit after {self.timeout}s')
+
+    def save(self, *instances, session=None) -> list:
+        """
+        Adds `instances`, new or modified, and commits them; a drop-in for
+        `session.add_all(instances); session.commit()`. Returns the saved
+        instances attached to `session`: with the writer enabled these are
+        copies, merged back from the writer thread.
+        """
+        session = session or self.session
+        if not self.enabled:
+            session.add_all(instances)
+            session.commit()
+            return list(instances)
+        _mark_written(session)
+        for instance in instances:
+            if instance in session:
+                session.expunge(instance)
+        saved = self.run(
+            lambda writer_session: [writer_session.merge(instance)
+                                    for instance in instances])
+        return [session.merge(instance, load=False) for instance in saved]
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _start(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._closed = False
+            self._thread = threading.Thread(
+                target=self._run, name=self.prefix.lower(), daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                deadline = time.monotonic() + self.max_delay
+                while len(self._queue) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = [self._queue.popleft()
+                         for _ in range(min(self.max_batch, len(self._queue)))]
+            self._commit(batch)
+
+    def _commit(self, batch):
+        session = None
+        done = list()
+        try:
+            # Inside the try: a failure must reach the futures of the batch,
+            # their callers wait on them.
+            bind = self.bind() if callable(self.bind) else self.bind
+            session = Session(bind=bind, autoflush=True, expire_on_commit=False)
+            if bind.dialect.name == 'sqlite':
+                # Takes the write lock up front, the savepoints then nest in
+                # this transaction instead of committing on release.
+                session.execute(text('BEGIN IMMEDIATE'))
+            for future, unit, args in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with session.begin_nested():
+                        result = unit(session, *args)
+                    done.append((future, result))
+                except Exception as e:
+                    future.set_exception(e)
+            session.commit()
+            session.expunge_all()
+        except Exception as e:
+            if session is not None:
+                session.rollback()
+            logger.log(logging.ERROR, f'{self.prefix}: {len(batch)} units lost {e!r}',
+                       extra=dict(bp='single-writer'))
+            for future, unit, args in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            if session is not None:
+                session.close()
+        for future, result in done:
+            future.set_result(result)
+
+
+def _mark_written(session):
+    # The write happens on the writer's own session, the submitting one
+    # must still read it back from the primary, see `RoutingSession.wrote`.
+    if hasattr(session, 'wrote'):
+        session.wrote = True
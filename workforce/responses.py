@@ -1,4 +1,5 @@
 from sqlalchemy.exc import DatabaseError, IntegrityError
+from sqlalchemy.orm import joinedload
 from marshmallow import ValidationError
 from .models import (
     Costumer,
@@ -23,10 +24,11 @@ from utils.responses import (
     GenericDeleteResponse
 )
 from utils.serializers import ImageSchema
+from utils.serializer_compiler import compile_schema
 from utils.images_helpers import save_to_image
-from settings.database import session
+from settings.database import session, database_writer
 from flask_bcrypt import generate_password_hash
-from flaskr import bcrypt
+from flaskr import hasher
 from http import HTTPStatus
 
 
@@ -49,8 +51,7 @@ class UserResponse(GenericCreateResponse, GenericRetriveResponse, GenericListRes
     def create_instance(self):
         user = User(**self.data)
 
-        password_crypt = bcrypt.generate_password_hash(
-            user.password, 10).decode('utf-8')
+        password_crypt = hasher.generate_password_hash(user.password)
 
         user.password = password_crypt
 
@@ -65,7 +66,7 @@ class UserImageResponse(GenericRetriveResponse, GenericCreateResponse):
 
         serializer = self.pre_create()
 
-        user = self.get_object(id)
+        user = self.get_object(id, read_only=False)
 
         image_name = save_to_image(
             blueprint_name,
@@ -75,9 +76,9 @@ class UserImageResponse(GenericRetriveResponse, GenericCreateResponse):
 
         user.thumbnail = image_name
 
-        session.commit()
+        user, = database_writer.save(user)
 
-        deserializer = UserSchema().dump(user)
+        deserializer = compile_schema(UserSchema).dump(user)
 
         return deserializer, HTTPStatus.OK
 
@@ -86,6 +87,7 @@ class SellerResponse(GenericCreateResponse, GenericRetriveResponse, GenericListR
     model = Seller
     schema = SellerSchema
     session = session
+    eager_loading = (joinedload(Seller.user),)
 
     def pre_validation(self):
         user = User.query.filter_by(
@@ -107,3 +109,4 @@ class SellerDeleteResponse(GenericDeleteResponse):
     model = Seller
     schema = SellerSchema
     session = session
+    eager_loading = (joinedload(Seller.user),)
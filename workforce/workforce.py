@@ -1,5 +1,6 @@
 from flask import Blueprint, request
 from utils.decorators import ErrorHandler
+from utils.requests import get_url_params
 from workforce.responses import (
     UserResponse,
     UserImageResponse,
@@ -53,6 +54,25 @@ def get_user(user_id):
     return response, status_code
 
 
+# List Users
+
+
+@workforce.route('/user', methods=['GET'])
+@jwt_required
+@ErrorHandler(logger, workforce)
+@admin_required
+def get_users():
+    params = get_url_params(request)
+    response, status_code = UserResponse(request).lists(
+        page=params['page'],
+        page_size=params['page_size'],
+        cursor=params['cursor'],
+        stream=params['stream'],
+        deleted=params['deleted']
+    )
+    return response, status_code
+
+
 # Create a Seller
 
 
@@ -77,6 +97,25 @@ def get_seller(seller_id):
     return response, status_code
 
 
+# List Sellers
+
+
+@workforce.route('/seller', methods=['GET'])
+@jwt_required
+@ErrorHandler(logger, workforce)
+@admin_required
+def get_sellers():
+    params = get_url_params(request)
+    response, status_code = SellerResponse(request).lists(
+        page=params['page'],
+        page_size=params['page_size'],
+        cursor=params['cursor'],
+        stream=params['stream'],
+        deleted=params['deleted']
+    )
+    return response, status_code
+
+
 # Delete Seller By ID
 
 